@@ -0,0 +1,106 @@
+"""
+Throughput of concurrent senders posting messages to a single room, with the sequence number of the room assigned
+by one UPDATE at READ COMMITTED (chat.common.add_message_to_chat_room) and with the SERIALIZABLE read, modify and
+save of the whole room row it replaced.
+
+    SENDGRID_API_KEY=x DEFAULT_FROM_EMAIL=test@example.com python -m benchmarks.busy_room
+"""
+
+import argparse
+import logging
+from contextlib import contextmanager
+
+from benchmarks.common import benchmark_database, create_room, create_users, run_concurrently
+
+from django.db import transaction
+from django.db.models.functions import Now
+
+import chat.service
+from chat.common import MESSAGE_PREVIEW_LENGTH
+from chat.models import ChatRoom, Message
+from chat.transactions import conflict_metrics
+
+"""
+Atomic block standing for isolated_atomic before message posts ran at READ COMMITTED, at the SERIALIZABLE default
+of connections.
+"""
+
+@contextmanager
+def serializable_atomic(mode, using=None):
+    with transaction.atomic(using=using):
+        yield
+
+"""
+add_message_to_chat_room before the sequence number was assigned by the database: the next sequence number is
+computed from the room read by the view and the whole row is saved.
+"""
+
+def legacy_add_message_to_chat_room(chat_room, message):
+    chat_room.last_message_seq += 1
+    message.seq = chat_room.last_message_seq
+    message.save()
+
+    chat_room.last_message_sender_id = message.sender_id
+    chat_room.last_message_text = message.text[:MESSAGE_PREVIEW_LENGTH]
+    chat_room.last_message_time = message.created_time
+    chat_room.last_updated_time = Now()
+    chat_room.save()
+
+"""
+Returns a room joined by given number of new users and a worker posting messages to it for each of them.
+"""
+
+def create_workers(num_senders):
+    users, clients = create_users(num_senders)
+    room = create_room(users)
+    workers = [
+        ('sender%d' % i, lambda client=client: client.post('/message/', {'room_id': str(room.id), 'message': 'hello'}, format='json').status_code == 200)
+        for i, client in enumerate(clients)
+    ]
+    return room, workers
+
+"""
+Run the senders for given number of seconds and print messages committed per second, failed requests and
+serialization conflicts, whether the sequence numbers of the room are gapless and its last message matches, and
+whether creation times of the messages follow their sequence numbers.
+"""
+
+def run(label, num_senders, duration):
+    room, workers = create_workers(num_senders)
+    conflict_metrics.endpoints.clear()
+    conflict_metrics.rooms.clear()
+    _, failed = run_concurrently(workers, duration)
+
+    messages = list(Message.objects.filter(chat_room=room).order_by('seq').values_list('seq', 'created_time'))
+    seqs = [seq for seq, _ in messages]
+    # Pages and sync order messages by created_time, which must therefore follow the sequence numbers.
+    times = [created_time for _, created_time in messages]
+    ordered = times == sorted(times)
+    room = ChatRoom.objects.get(pk=room.pk)
+    last_message = Message.objects.filter(chat_room=room).order_by('-seq').first()
+    consistent = (
+        seqs == list(range(1, len(seqs) + 1)) and room.last_message_seq == len(seqs)
+        and last_message is not None and (room.last_message_sender_id, room.last_message_time) == (last_message.sender_id, last_message.created_time)
+    )
+    conflicts = conflict_metrics.snapshot()['endpoints'].get('message-post', {}).get('conflict', 0)
+    print("%-16s msg/s %8.1f  failed %5d  conflicts %5d  consistent %s  ordered %s" % (label, len(seqs) / duration, sum(failed.values()), conflicts, consistent, ordered))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--senders', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    # Conflicts are counted, not logged.
+    logging.disable(logging.WARNING)
+    with benchmark_database():
+        add_message_to_chat_room, isolated_atomic = chat.service.add_message_to_chat_room, chat.service.isolated_atomic
+        chat.service.add_message_to_chat_room, chat.service.isolated_atomic = legacy_add_message_to_chat_room, serializable_atomic
+        try:
+            run('serializable', args.senders, args.duration)
+        finally:
+            chat.service.add_message_to_chat_room, chat.service.isolated_atomic = add_message_to_chat_room, isolated_atomic
+        run('read committed', args.senders, args.duration)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reachout.settings')
+
+import django
+
+django.setup()
+
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from chat.common import ChatRoomUserState
+from chat.models import ChatRoom, ChatRoomUser, InboxEntry, User
+
+"""
+Run the block against a freshly created test database (see settings.DATABASES), destroyed at exit, so that
+benchmarks never touch real data.
+"""
+
+@contextmanager
+def benchmark_database():
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+"""
+Create given number of users with auth tokens. Returns the users and API clients authenticated as each of them.
+"""
+
+def create_users(num_users, prefix='user'):
+    offset = User.objects.count()
+    users = User.objects.bulk_create([
+        User(email='%s%d@example.com' % (prefix, offset + i), username='%s%d' % (prefix, offset + i), password='!')
+        for i in range(num_users)
+    ])
+    tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+    clients = []
+    for token in tokens:
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        clients.append(client)
+    return users, clients
+
+"""
+Create a chat room joined by given users, as left by an accepted invite. Returns the room.
+"""
+
+def create_room(users, name=''):
+    now = timezone.now()
+    room = ChatRoom.objects.create(creator_user_id=users[0].id, name=name)
+    ChatRoomUser.objects.bulk_create([ChatRoomUser(chat_room=room, user_id=user.id, state=ChatRoomUserState.JOINED.name, joined_time=now) for user in users])
+    InboxEntry.objects.bulk_create([InboxEntry(chat_room=room, user_id=user.id, visible=True, sort_time=now) for user in users])
+    return room
+
+"""
+Call every worker in a loop on its own thread for given number of seconds. A worker returns True when its call
+succeeded. Returns the number of successful and failed calls per worker name.
+"""
+
+def run_concurrently(workers, duration):
+    succeeded = {name: 0 for name, _ in workers}
+    failed = {name: 0 for name, _ in workers}
+    lock = threading.Lock()
+
+    def run(name, worker):
+        deadline = time.monotonic() + duration
+        try:
+            while time.monotonic() < deadline:
+                ok = worker()
+                with lock:
+                    if ok:
+                        succeeded[name] += 1
+                    else:
+                        failed[name] += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(name, worker)) for name, worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return succeeded, failed
+
+"""
+Returns the mean duration in milliseconds of given function over given number of calls, after one warm up call.
+"""
+
+def time_per_call(function, num_calls):
+    function()
+    start = time.perf_counter()
+    for _ in range(num_calls):
+        function()
+    return (time.perf_counter() - start) * 1000 / num_calls
@@ -0,0 +1,93 @@
+"""
+Throughput of read and write endpoints under a mixed load, with GET views running in read only transactions
+(chat.transactions.read_only_atomic) and with the SERIALIZABLE transactions they used before.
+
+    SENDGRID_API_KEY=x DEFAULT_FROM_EMAIL=test@example.com python -m benchmarks.mixed_load
+"""
+
+import argparse
+import itertools
+import logging
+from contextlib import contextmanager
+
+from benchmarks.common import benchmark_database, create_room, create_users, run_concurrently
+
+from django.db import transaction
+
+import chat.service
+from chat.transactions import conflict_metrics
+
+"""
+Atomic block standing for read_only_atomic before read only transactions, running at the SERIALIZABLE default of
+connections.
+"""
+
+@contextmanager
+def serializable_atomic(mode=None, using=None):
+    with transaction.atomic(using=using):
+        yield
+
+"""
+Returns the workers of the mixed load: readers poll the chat list, message history and posts feed while writers
+post messages, mark their room read and create posts. Every writer has a room of its own shared with all readers,
+so that the conflicts left come from the reads rather than from writers contending for the same room.
+"""
+
+def create_workers(num_readers, num_writers):
+    users, clients = create_users(num_readers + num_writers)
+    readers, writers = clients[:num_readers], clients[num_readers:]
+    rooms = [create_room(users[:num_readers] + [user], name='room%d' % i) for i, user in enumerate(users[num_readers:])]
+
+    workers = []
+    for i, client in enumerate(readers):
+        requests = itertools.cycle(
+            [('/chats/', {})] + [('/message/', {'room_id': str(room.id)}) for room in rooms] + [('/post/', {})]
+        )
+        workers.append(('reader%d' % i, lambda client=client, requests=requests: client.get(*next(requests)).status_code == 200))
+
+    for i, (client, room) in enumerate(zip(writers, rooms)):
+        requests = itertools.cycle([
+            ('/message/', {'room_id': str(room.id), 'message': 'hello'}),
+            ('/read/', {'room_id': str(room.id)}),
+            ('/post/', {'title': 'title', 'description': 'description'}),
+        ])
+        workers.append(('writer%d' % i, lambda client=client, requests=requests: client.post(*next(requests), format='json').status_code in (200, 201)))
+    return workers
+
+"""
+Run the mixed load for given number of seconds and print requests per second of readers and writers, failed
+requests and serialization conflicts of write endpoints.
+"""
+
+def run(label, workers, duration):
+    conflict_metrics.endpoints.clear()
+    conflict_metrics.rooms.clear()
+    succeeded, failed = run_concurrently(workers, duration)
+
+    reads = sum(count for name, count in succeeded.items() if name.startswith('reader'))
+    writes = sum(count for name, count in succeeded.items() if name.startswith('writer'))
+    conflicts = sum(counts.get('conflict', 0) for counts in conflict_metrics.snapshot()['endpoints'].values())
+    print("%-14s reads/s %8.1f  writes/s %8.1f  failed %5d  conflicts %5d" % (label, reads / duration, writes / duration, sum(failed.values()), conflicts))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    # Conflicts are counted, not logged.
+    logging.disable(logging.WARNING)
+    with benchmark_database():
+        workers = create_workers(args.readers, args.writers)
+
+        read_only_atomic = chat.service.read_only_atomic
+        chat.service.read_only_atomic = serializable_atomic
+        try:
+            run('serializable', workers, args.duration)
+        finally:
+            chat.service.read_only_atomic = read_only_atomic
+        run('read only', workers, args.duration)
+
+if __name__ == '__main__':
+    main()
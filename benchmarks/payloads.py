@@ -0,0 +1,58 @@
+"""
+Size and encode time of the chat list, message and posts feed pages as JSON, as MessagePack, and compressed with
+gzip and brotli, as negotiated by the Accept and Accept-Encoding headers.
+
+    SENDGRID_API_KEY=x DEFAULT_FROM_EMAIL=test@example.com python -m benchmarks.payloads
+"""
+
+import argparse
+
+from benchmarks.common import benchmark_database, time_per_call
+from benchmarks.serialization import seed
+
+from django.utils.text import compress_string
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from chat.compression import brotli
+from chat.renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+
+"""
+Returns the encodings compared, as (name, function encoding response data to bytes). Encodings whose optional
+package is not installed are left out.
+"""
+
+def get_encodings():
+    encodings = [('json', FastJSONRenderer().render), ('json+gzip', lambda data: compress_string(FastJSONRenderer().render(data)))]
+    if brotli is not None:
+        encodings.append(('json+br', lambda data: brotli.compress(FastJSONRenderer().render(data), quality=5)))
+    if msgpack is not None:
+        encodings.append(('msgpack', MessagePackRenderer().render))
+        encodings.append(('msgpack+gzip', lambda data: compress_string(MessagePackRenderer().render(data))))
+        if brotli is not None:
+            encodings.append(('msgpack+br', lambda data: brotli.compress(MessagePackRenderer().render(data), quality=5)))
+    return encodings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        user, room = seed()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=user).key)
+        pages = [
+            ('chats/', client.get('/chats/').data),
+            ('message/', client.get('/message/', {'room_id': str(room.id)}).data),
+            ('post/', client.get('/post/').data),
+        ]
+
+        for path, data in pages:
+            json_size = len(FastJSONRenderer().render(data))
+            for name, encode in get_encodings():
+                size = len(encode(data))
+                print("%-9s %-13s %7d bytes (%3.0f%%)  %6.3f ms" % (path, name, size, 100 * size / json_size, time_per_call(lambda: encode(data), args.calls)))
+
+if __name__ == '__main__':
+    main()
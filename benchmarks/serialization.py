@@ -0,0 +1,97 @@
+"""
+Time to query, serialize and render a page of 20 messages, 50 posts and 50 chat rooms with DRF ModelSerializers
+and model instances, and with the values() rows and plain serializers the views use, encoded by FastJSONRenderer.
+
+    SENDGRID_API_KEY=x DEFAULT_FROM_EMAIL=test@example.com python -m benchmarks.serialization
+"""
+
+import argparse
+from datetime import timedelta
+
+from benchmarks.common import benchmark_database, create_room, create_users, time_per_call
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from chat.common import create_chat_room_responses
+from chat.inbox import INBOX_RESPONSE_FIELDS, create_inbox_responses
+from chat.models import ChatRoom, InboxEntry, Message, Post
+from chat.renderers import FastJSONRenderer
+from chat.serializers import MESSAGE_VALUES, POST_VALUES, MessageSerializer, PostSerializer, serialize_messages, serialize_posts
+
+NUM_MESSAGES = 20
+NUM_POSTS = 50
+NUM_ROOMS = 50
+
+"""
+Create a room with a page of messages, a page of posts by distinct users, and a page of rooms of one user. Returns
+the user and the room.
+"""
+
+def seed():
+    now = timezone.now()
+    users, _ = create_users(max(NUM_POSTS, NUM_ROOMS + 1))
+    user = users[0]
+    rooms = [create_room([user, other], name='room%d' % i) for i, other in enumerate(users[1:NUM_ROOMS + 1])]
+
+    Message.objects.bulk_create([
+        Message(chat_room=rooms[0], sender_id=users[i % 2].id, text='message %d' % i, seq=i + 1, created_time=now - timedelta(seconds=i))
+        for i in range(NUM_MESSAGES)
+    ])
+    Post.objects.bulk_create([
+        Post(creator_user=users[i], title='post %d' % i, description='description %d' % i, created_time=now - timedelta(seconds=i))
+        for i in range(NUM_POSTS)
+    ])
+    for i, room in enumerate(rooms):
+        ChatRoom.objects.filter(pk=room.pk).update(last_message_seq=i + 1, last_message_sender_id=user.id, last_message_text='last %d' % i, last_message_time=now, last_updated_time=now - timedelta(minutes=i))
+        InboxEntry.objects.filter(chat_room=room).update(sort_time=now - timedelta(minutes=i), num_unread_messages=i + 1, last_message_sender_id=user.id, last_message_text='last %d' % i, last_message_time=now)
+    return user, rooms[0]
+
+def messages_before(room):
+    messages = Message.objects.filter(chat_room=room).order_by('-created_time', '-id')[:NUM_MESSAGES]
+    return JSONRenderer().render(MessageSerializer(messages, many=True).data)
+
+def messages_after(room):
+    messages = Message.objects.filter(chat_room=room).order_by('-created_time', '-id').values(*MESSAGE_VALUES)[:NUM_MESSAGES]
+    return FastJSONRenderer().render(serialize_messages(messages))
+
+def posts_before():
+    posts = Post.objects.select_related('creator_user').order_by('-created_time', '-id')[:NUM_POSTS]
+    data = []
+    for post, serialized in zip(posts, PostSerializer(posts, many=True).data):
+        serialized = serialized.copy()
+        serialized['username'] = post.creator_user.username
+        data.append(serialized)
+    return JSONRenderer().render(data)
+
+def posts_after():
+    posts = Post.objects.order_by('-created_time', '-id').values(*POST_VALUES)[:NUM_POSTS]
+    return FastJSONRenderer().render(serialize_posts(posts))
+
+def rooms_before(user):
+    rooms = list(ChatRoom.objects.filter(chatroomuser__user_id=user.id).order_by('-last_updated_time', '-id')[:NUM_ROOMS])
+    return JSONRenderer().render(create_chat_room_responses(user.id, rooms))
+
+def rooms_after(user):
+    entries = list(InboxEntry.objects.filter(user_id=user.id, visible=True).order_by('-sort_time', '-id').values(*INBOX_RESPONSE_FIELDS)[:NUM_ROOMS])
+    return FastJSONRenderer().render(create_inbox_responses(entries))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        user, room = seed()
+        pages = [
+            ('%d messages' % NUM_MESSAGES, lambda: messages_before(room), lambda: messages_after(room)),
+            ('%d posts' % NUM_POSTS, posts_before, posts_after),
+            ('%d rooms' % NUM_ROOMS, lambda: rooms_before(user), lambda: rooms_after(user)),
+        ]
+        for name, before, after in pages:
+            print("%-12s before %7.2f ms  after %7.2f ms  same bytes %s" % (
+                name, time_per_call(before, args.calls), time_per_call(after, args.calls), before() == after(),
+            ))
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
+
+    def ready(self):
+        # Registers the per database query counters, the feed cache invalidation signals and the system checks.
+        import chat.checks
+        import chat.feed
+        import chat.routers
@@ -0,0 +1,253 @@
+import gzip
+import itertools
+import json
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from chat.models import ArchivedMessageSegment, Message, MessageArchive
+from chat.serializers import MESSAGE_VALUES
+
+logger = logging.getLogger(__name__)
+
+# Monthly partitions of the message table are named after this prefix and their month, as in chat_message_p202401.
+PARTITION_PREFIX = 'chat_message_p'
+PARTITION_NAME_RE = re.compile(r'^chat_message_p(\d{4})(\d{2})$')
+
+# Partition receiving messages outside of every monthly partition.
+DEFAULT_PARTITION = 'chat_message_default'
+
+# Longest wait for the lock on the message table needed to detach a partition. Every query of the table queues
+# behind a waiting DETACH, so the archiving gives up instead and is retried by its next run.
+DETACH_LOCK_TIMEOUT = '2s'
+
+"""
+Returns the first instant of the month (in UTC) of given timestamp, moved by given number of months.
+"""
+
+def month_start(timestamp, months=0):
+    timestamp = timestamp.astimezone(dt_timezone.utc)
+    year, month = divmod(timestamp.year * 12 + timestamp.month - 1 + months, 12)
+    return datetime(year, month + 1, 1, tzinfo=dt_timezone.utc)
+
+"""
+Returns the name of the partition of the month starting at given timestamp.
+"""
+
+def partition_name(month):
+    return PARTITION_PREFIX + month.strftime('%Y%m')
+
+"""
+Returns the start of month of every monthly partition currently attached to the message table, oldest first.
+"""
+
+def get_message_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'chat_message'::regclass")
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match is not None:
+            months.append(datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc))
+    return sorted(months)
+
+"""
+Create the partition of the month starting at given timestamp. Messages of that month which landed in the default
+partition are moved to it.
+"""
+
+def create_message_partition(month):
+    name = connection.ops.quote_name(partition_name(month))
+    start, end = month, month_start(month, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE %s (LIKE chat_message INCLUDING DEFAULTS)" % name)
+        cursor.execute(
+            "WITH moved AS (DELETE FROM %s WHERE created_time >= %%s AND created_time < %%s RETURNING *) INSERT INTO %s SELECT * FROM moved" % (DEFAULT_PARTITION, name),
+            [start, end],
+        )
+        if cursor.rowcount > 0:
+            logger.warning("Moved %d messages from the default partition to %s", cursor.rowcount, name)
+        cursor.execute("ALTER TABLE chat_message ATTACH PARTITION %s FOR VALUES FROM (%%s) TO (%%s)" % name, [start, end])
+
+"""
+Create the missing partitions of the current month and of given number of months ahead. Returns the names of the
+partitions created.
+"""
+
+def ensure_message_partitions(months_ahead):
+    existing = set(get_message_partitions())
+    created = []
+    for months in range(months_ahead + 1):
+        month = month_start(timezone.now(), months)
+        if month not in existing:
+            create_message_partition(month)
+            created.append(partition_name(month))
+    return created
+
+"""
+Write the messages of the partition of the month starting at given timestamp to a gzip file in MESSAGE_ARCHIVE_DIR,
+then detach and drop the partition. The file holds one gzip member per chat room (see ArchivedMessageSegment) and
+is written before the partition is detached, so a failed attempt leaves the messages in the partition and can be
+retried. The partition is checked against the file and the segments are stored before detaching, so the exclusive
+lock on the message table is held only for the detach and drop. Returns the Message Archive.
+"""
+
+def archive_message_partition(month):
+    name = partition_name(month)
+    start, end = month, month_start(month, 1)
+    file_name = name + '.jsonl.gz'
+    path = os.path.join(settings.MESSAGE_ARCHIVE_DIR, file_name)
+    os.makedirs(settings.MESSAGE_ARCHIVE_DIR, exist_ok=True)
+
+    # Only reads of the partition, pruned by the created_time range.
+    messages = (
+        Message.objects.filter(created_time__gte=start, created_time__lt=end)
+        .order_by('chat_room_id', '-created_time', '-id')
+        .values('chat_room_id', *MESSAGE_VALUES)
+    )
+    segments = []
+    num_messages = 0
+    with open(path + '.tmp', 'wb') as archive_file:
+        for chat_room_id, rows in itertools.groupby(messages.iterator(chunk_size=5000), key=lambda row: row['chat_room_id']):
+            rows = list(rows)
+            lines = [json.dumps({"id": str(row['id']), "sender_id": str(row['sender_id']), "created_time": row['created_time'].isoformat(), "text": row['text'], "seq": row['seq']}) + '\n' for row in rows]
+            data = gzip.compress(''.join(lines).encode())
+            segments.append(ArchivedMessageSegment(
+                chat_room_id=chat_room_id, offset=archive_file.tell(), length=len(data), num_messages=len(rows),
+                oldest_created_time=rows[-1]['created_time'], newest_created_time=rows[0]['created_time'],
+            ))
+            archive_file.write(data)
+            num_messages += len(rows)
+        archive_file.flush()
+        os.fsync(archive_file.fileno())
+    os.replace(path + '.tmp', path)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        quoted_name = connection.ops.quote_name(name)
+        # Blocks writes to the partition only, while reads of the message table go on during the checks below.
+        cursor.execute("LOCK TABLE %s IN SHARE MODE" % quoted_name)
+        # Messages may have been deleted since the file was written, for example by an account purge.
+        cursor.execute("SELECT count(*) FROM %s" % quoted_name)
+        if cursor.fetchone()[0] != num_messages:
+            raise RuntimeError("Messages of %s changed while archiving, try again" % name)
+
+        archive = MessageArchive.objects.create(partition=name, start_time=start, end_time=end, path=file_name, num_messages=num_messages)
+        for segment in segments:
+            segment.archive = archive
+        ArchivedMessageSegment.objects.bulk_create(segments, batch_size=1000)
+
+        # The message table is locked exclusively from here until the commit.
+        cursor.execute("SET LOCAL lock_timeout = %s", [DETACH_LOCK_TIMEOUT])
+        cursor.execute("ALTER TABLE chat_message DETACH PARTITION %s" % quoted_name)
+        cursor.execute("DROP TABLE %s" % quoted_name)
+    return archive
+
+"""
+Archive every partition of a month ending given number of months before the current month or earlier, oldest
+first. Returns the archives created.
+"""
+
+def archive_old_partitions(hot_months):
+    cutoff = month_start(timezone.now(), -hot_months)
+    archives = []
+    for month in get_message_partitions():
+        if month_start(month, 1) <= cutoff:
+            archive = archive_message_partition(month)
+            logger.info("Archived %d messages of %s", archive.num_messages, archive.partition)
+            archives.append(archive)
+    return archives
+
+"""
+Erase the archived messages of given chat room by overwriting their segments with zeros in the archive files, and
+delete the segments. The other segments of the files stay readable since each is a gzip member read on its own.
+Returns the number of messages erased.
+WARNING: Must be called within transaction context.
+"""
+
+def erase_archived_messages(chat_room_id):
+    segments = ArchivedMessageSegment.objects.filter(chat_room_id=chat_room_id)
+    num_messages = 0
+    for segment in segments.select_related('archive'):
+        try:
+            with open(os.path.join(settings.MESSAGE_ARCHIVE_DIR, segment.archive.path), 'r+b') as archive_file:
+                archive_file.seek(segment.offset)
+                archive_file.write(bytes(segment.length))
+                archive_file.flush()
+                os.fsync(archive_file.fileno())
+        except FileNotFoundError:
+            logger.warning("Archive file %s of chat room %s is missing", segment.archive.path, chat_room_id)
+        num_messages += segment.num_messages
+    segments.delete()
+    return num_messages
+
+"""
+Archived messages of a chat room, read from archive files in the same format as values() rows of MESSAGE_VALUES.
+Passed to paginate_by_cursor so that pages of messages continue into the archive once the message table has no
+older messages. Archived messages are older than every message of the table, so the two never interleave.
+Messages created at or after given before timestamp are left out.
+"""
+
+class ArchivedMessages:
+
+    def __init__(self, chat_room_id, before=None):
+        self.chat_room_id = chat_room_id
+        self.before = before
+
+    def get_segments(self):
+        segments = ArchivedMessageSegment.objects.filter(chat_room_id=self.chat_room_id).select_related('archive')
+        if self.before is not None:
+            segments = segments.filter(oldest_created_time__lt=self.before)
+        return segments
+
+    """
+    Returns the messages of given segment, most recent first.
+    """
+
+    def read_segment(self, segment):
+        with open(os.path.join(settings.MESSAGE_ARCHIVE_DIR, segment.archive.path), 'rb') as archive_file:
+            archive_file.seek(segment.offset)
+            data = gzip.decompress(archive_file.read(segment.length))
+
+        rows = []
+        for line in data.decode().splitlines():
+            message = json.loads(line)
+            created_time = datetime.fromisoformat(message['created_time'])
+            if self.before is None or created_time < self.before:
+                rows.append({"id": uuid.UUID(message['id']), "sender_id": uuid.UUID(message['sender_id']), "created_time": created_time, "text": message['text'], "seq": message['seq']})
+        return rows
+
+    """
+    Returns up to limit messages older than given (timestamp, id) position, or the most recent ones if timestamp is
+    None, most recent first.
+    """
+
+    def older(self, timestamp, row_id, limit):
+        segments = self.get_segments()
+        if timestamp is not None:
+            segments = segments.filter(oldest_created_time__lte=timestamp)
+        rows = []
+        for segment in segments.order_by('-newest_created_time'):
+            rows += [row for row in self.read_segment(segment) if timestamp is None or (row['created_time'], row['id']) < (timestamp, row_id)]
+            if len(rows) >= limit:
+                break
+        return rows[:limit]
+
+    """
+    Returns up to limit messages newer than given (timestamp, id) position, oldest first.
+    """
+
+    def newer(self, timestamp, row_id, limit):
+        rows = []
+        for segment in self.get_segments().filter(newest_created_time__gte=timestamp).order_by('newest_created_time'):
+            rows += [row for row in reversed(self.read_segment(segment)) if (row['created_time'], row['id']) > (timestamp, row_id)]
+            if len(rows) >= limit:
+                break
+        return rows[:limit]
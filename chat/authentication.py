@@ -0,0 +1,119 @@
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from chat.models import TokenRevocation, User
+
+SIGNED_TOKEN_SALT = 'chat.signed-token'
+
+"""
+Revocations of signed tokens known to this process. Refreshed from the TokenRevocation table every
+SIGNED_TOKEN_REVOCATION_REFRESH seconds so that revocations made by other processes propagate within that delay.
+"""
+
+class RevocationList:
+
+    # Revocations are re-read from this many seconds before the last refresh to tolerate clock skew and
+    # transactions committing late.
+    REFRESH_OVERLAP = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.min_versions = {}
+        self.refreshed_time = None
+        self.refreshed_monotonic = None
+
+    def add(self, user_id, token_version):
+        with self.lock:
+            self.min_versions[str(user_id)] = max(self.min_versions.get(str(user_id), 0), token_version)
+
+    def is_revoked(self, user_id, token_version):
+        self.refresh_if_stale()
+        with self.lock:
+            return token_version < self.min_versions.get(str(user_id), 0)
+
+    def refresh_if_stale(self):
+        with self.lock:
+            if self.refreshed_monotonic is not None and time.monotonic() - self.refreshed_monotonic < settings.SIGNED_TOKEN_REVOCATION_REFRESH:
+                return
+            now = timezone.now()
+            if self.refreshed_time is None:
+                # Revocations older than the maximum token age can no longer match a valid token.
+                since = now - timedelta(seconds=settings.SIGNED_TOKEN_MAX_AGE)
+            else:
+                since = self.refreshed_time - timedelta(seconds=self.REFRESH_OVERLAP)
+            self.refreshed_time = now
+            self.refreshed_monotonic = time.monotonic()
+
+        for user_id, token_version in TokenRevocation.objects.filter(created_time__gt=since).values_list('user_id', 'token_version'):
+            self.add(user_id, token_version)
+
+revocation_list = RevocationList()
+
+"""
+Returns a signed auth token for given user carrying their id and token version.
+"""
+
+def issue_signed_token(user):
+    return signing.dumps([str(user.pk), user.token_version], salt=SIGNED_TOKEN_SALT)
+
+"""
+Revoke all signed auth tokens issued to given user so far.
+WARNING: Must be called within transaction context.
+"""
+
+def revoke_signed_tokens(user):
+    user.token_version += 1
+    User.objects.filter(pk=user.pk).update(token_version=user.token_version)
+    TokenRevocation.objects.create(user_id=user.pk, token_version=user.token_version)
+
+    user_id, token_version = user.pk, user.token_version
+    transaction.on_commit(lambda: revocation_list.add(user_id, token_version))
+
+"""
+Authenticates requests with signed auth tokens without querying the database. Clients send the token
+in the Authorization header as "Signed <token>". The authenticated user only carries its id and must not
+be saved; other fields must be read from the database when needed.
+"""
+
+class SignedTokenAuthentication(BaseAuthentication):
+
+    keyword = 'Signed'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token header.')
+        return self.authenticate_credentials(token)
+
+    def authenticate_credentials(self, token):
+        try:
+            user_id, token_version = signing.loads(token, salt=SIGNED_TOKEN_SALT, max_age=settings.SIGNED_TOKEN_MAX_AGE)
+            user_id = uuid.UUID(user_id)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise AuthenticationFailed('Invalid token.')
+
+        if revocation_list.is_revoked(user_id, token_version):
+            raise AuthenticationFailed('Token revoked.')
+
+        user = User(id=user_id, token_version=token_version)
+        user._state.adding = False
+        return (user, token)
+
+    def authenticate_header(self, request):
+        return self.keyword
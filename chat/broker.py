@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+
+import psycopg2
+import psycopg2.extensions
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of undelivered events queued for a subscriber. Further events are dropped for slow subscribers.
+MAX_QUEUED_EVENTS = 1000
+
+"""
+Subscription of a connected client to the events of a user. Events are published from any thread
+and consumed from the event loop the subscription was created on.
+"""
+
+class Subscription:
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self.offer, event)
+        except RuntimeError:
+            # Event loop of the subscriber is closed.
+            pass
+
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Dropping event for slow subscriber of user %s", self.user_id)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+"""
+Broker delivering events to subscribers connected to this process. Suitable for a single node.
+"""
+
+class InProcessBroker:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    """
+    Publish event to all subscribers of given users.
+    """
+
+    def publish(self, user_ids, event):
+        self.deliver(user_ids, event)
+
+    def deliver(self, user_ids, event):
+        with self.lock:
+            subscriptions = [s for user_id in user_ids for s in self.subscriptions.get(str(user_id), ())]
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    """
+    Subscribe to events of given user. Must be called from a running event loop.
+    """
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self.lock:
+            self.subscriptions.setdefault(str(user_id), set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            user_subscriptions = self.subscriptions.get(str(subscription.user_id))
+            if user_subscriptions is not None:
+                user_subscriptions.discard(subscription)
+                if len(user_subscriptions) == 0:
+                    del self.subscriptions[str(subscription.user_id)]
+
+"""
+Broker publishing events through Postgres NOTIFY so that subscribers connected to any node receive them.
+Each node runs a listener thread with a dedicated connection which delivers notifications to its local subscribers.
+"""
+
+class PostgresBroker(InProcessBroker):
+
+    # Postgres rejects notification payloads of 8000 bytes or more.
+    MAX_PAYLOAD_SIZE = 7900
+
+    def __init__(self):
+        super().__init__()
+        self.channel = getattr(settings, 'CHAT_BROKER_CHANNEL', 'reachout_events')
+        self.listener = None
+
+    def publish(self, user_ids, event):
+        payload = json.dumps({"user_ids": [str(user_id) for user_id in user_ids], "event": event})
+        if len(payload.encode()) > self.MAX_PAYLOAD_SIZE:
+            # Send only the event type and room so that clients refetch the rest.
+            payload = json.dumps({"user_ids": [str(user_id) for user_id in user_ids], "event": {"type": event["type"], "room_id": event.get("room_id"), "truncated": True}})
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    def subscribe(self, user_id):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, name="chat-broker-listener", daemon=True)
+                self.listener.start()
+        return super().subscribe(user_id)
+
+    def listen(self):
+        while True:
+            try:
+                self.listen_once()
+            except psycopg2.Error as e:
+                logger.warning("Broker listener connection failed: %s", e)
+            # Reconnect after a pause.
+            threading.Event().wait(1)
+
+    def listen_once(self):
+        db = settings.DATABASES['default']
+        listen_connection = psycopg2.connect(dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'], host=db['HOST'], port=db['PORT'])
+        try:
+            listen_connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with listen_connection.cursor() as cursor:
+                cursor.execute("LISTEN " + self.channel)
+
+            while True:
+                if select.select([listen_connection], [], [], 5) == ([], [], []):
+                    continue
+                listen_connection.poll()
+                while listen_connection.notifies:
+                    notify = listen_connection.notifies.pop(0)
+                    payload = json.loads(notify.payload)
+                    self.deliver(payload["user_ids"], payload["event"])
+        finally:
+            listen_connection.close()
+
+broker = None
+broker_lock = threading.Lock()
+
+"""
+Returns the broker configured with the CHAT_BROKER setting.
+"""
+
+def get_broker():
+    global broker
+    with broker_lock:
+        if broker is None:
+            broker = import_string(getattr(settings, 'CHAT_BROKER', 'chat.broker.InProcessBroker'))()
+        return broker
+
+"""
+Publish event to given users once the current transaction commits. Nothing is published if it rolls back.
+"""
+
+def publish_on_commit(user_ids, event):
+    user_ids = [str(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: get_broker().publish(user_ids, event))
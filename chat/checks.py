@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Cache backends whose entries are only seen by the process which wrote them.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+"""
+The default cache carries invalidations of the posts feed (chat.feed) and pins of users to the primary database
+(chat.routers), which every process must see. Deployments must configure a shared cache with CACHE_URL rather than
+the local memory default, which only suits a single development process.
+"""
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [Error(
+            "The default cache is local to each process.",
+            hint="Set CACHE_URL to a cache shared by every process, such as redis://127.0.0.1:6379/1.",
+            id='chat.E001',
+        )]
+    return []
@@ -1,7 +1,9 @@
 from enum import Enum
 from datetime import date, datetime
 
-from chat.models import ChatRoomUser, User, Message
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from chat.models import ChatRoom, ChatRoomUser, User, Message
 
 """
 Enum defining current state of user in chat room.
@@ -11,6 +13,11 @@ class ChatRoomUserState(Enum):
     INVITED = 1
     JOINED = 2
     REJECTED = 3
+    # Membership of a deleted account in a room purged of everything else (see chat.deletion).
+    DELETED = 4
+
+# Maximum length of the last message text cached on a chat room.
+MESSAGE_PREVIEW_LENGTH = 200
 
 """
 Returns dictionary object of chat room.
@@ -18,28 +25,115 @@ WARNING: Must be called within transaction context.
 """
 
 def create_chat_room_reponse(user_id, chat_room):
+    return create_chat_room_responses(user_id, [chat_room])[0]
+
+"""
+Returns list of dictionary objects for given chat rooms, in the same order.
+Last message and unread count are read from the cached columns of the rooms, so
+the number of queries is fixed and does not grow with the number of rooms.
+WARNING: Must be called within transaction context.
+"""
+
+def create_chat_room_responses(user_id, chat_rooms):
+    room_ids = [chat_room.id for chat_room in chat_rooms]
+    if len(room_ids) == 0:
+        return []
+
+    # Query users of all rooms along with their usernames.
+    chat_room_users = list(ChatRoomUser.objects.filter(chat_room__id__in=room_ids).values('chat_room_id', 'user_id', 'state', 'last_read_seq'))
+    users_by_room = get_users_by_room(chat_room_users)
+    last_read_seq_by_room = {cru['chat_room_id']: cru['last_read_seq'] for cru in chat_room_users if cru['user_id'] == user_id}
+
+    results = []
+    for chat_room in chat_rooms:
+        last_message_dict = None
+        if chat_room.last_message_seq > 0:
+            last_message_dict = {"sender_id": chat_room.last_message_sender_id, "text": chat_room.last_message_text, "created_time": chat_room.last_message_time}
+        num_unread_messages = chat_room.last_message_seq - last_read_seq_by_room.get(chat_room.id, 0)
+
+        results.append({"room_id": str(chat_room.id), "name": chat_room.name, "last_updated_time": chat_room.last_updated_time, "last_message": last_message_dict, "users": users_by_room.get(chat_room.id, []), "num_unread_messages": num_unread_messages})
+    return results
+
+"""
+Returns dictionary of room id to list of users in the room, given chat room user rows as dictionaries.
+Usernames of all users are fetched in a single query.
+WARNING: Must be called within transaction context.
+"""
 
-    last_message = Message.objects.order_by('-created_time')[0]
-    last_message_dict = {"sender_id": last_message.sender_id, "text": last_message.text, "created_time": last_message.created_time}
+def get_users_by_room(chat_room_users):
+    usernames = dict(User.objects.filter(id__in={cru['user_id'] for cru in chat_room_users}).values_list('id', 'username'))
+    users_by_room = {}
+    for chat_room_user in chat_room_users:
+        users_by_room.setdefault(chat_room_user['chat_room_id'], []).append({"user_id": str(chat_room_user['user_id']), "state": chat_room_user['state'], 'username': usernames.get(chat_room_user['user_id'], "")})
+    return users_by_room
 
-    # Query unread messages in room for given user.
-    last_read_time = ChatRoomUser.objects.filter(user_id__exact=user_id).get(chat_room__id__exact=chat_room.id).last_read_time
-    num_unread_messages = 0
-    if last_read_time is None:
-        num_unread_messages = len(Message.objects.filter(chat_room__id__exact=chat_room.id))
-    else:
-        num_unread_messages = len(Message.objects.filter(chat_room__id__exact=chat_room.id).filter(created_time__gt=last_read_time))
+"""
+Saves given new message to the chat room. The message is assigned the next sequence number of the room
+and the cached last message fields of the room are updated, in a single statement which increments the sequence
+number of the current row rather than the one read earlier. Concurrent senders in a read committed transaction
+therefore wait for the row lock of the room until the previous sender commits, instead of failing. The creation
+time of the message is taken by the same statement once the lock is held, so that it follows the sequence order.
+WARNING: Must be called within transaction context.
+"""
 
-    result_room = {"room_id": str(chat_room.id), "name": chat_room.name, "last_updated_time": chat_room.last_updated_time, "last_message":  last_message_dict, "users": [], "num_unread_messages": num_unread_messages}
+def add_message_to_chat_room(chat_room, message):
+    text = message.text[:MESSAGE_PREVIEW_LENGTH]
+    connection = connections[DEFAULT_DB_ALIAS]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE %s SET last_message_seq = last_message_seq + 1, last_message_sender_id = %%s, last_message_text = %%s, last_message_time = clock_timestamp(), last_updated_time = clock_timestamp() WHERE id = %%s RETURNING last_message_seq, last_message_time, last_updated_time"
+            % connection.ops.quote_name(ChatRoom._meta.db_table),
+            [message.sender_id, text, chat_room.id],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise ChatRoom.DoesNotExist()
 
-    chatRoomUsers = ChatRoomUser.objects.filter(chat_room__id__exact=chat_room.id)
+    chat_room.last_message_seq, chat_room.last_message_time, chat_room.last_updated_time = row
+    chat_room.last_message_sender_id = message.sender_id
+    chat_room.last_message_text = text
+    message.seq = chat_room.last_message_seq
+    message.created_time = chat_room.last_message_time
+    message.save()
 
-    for chatRoomUser in chatRoomUsers:
-        # Fetch username info.
-        chatUser = User.objects.get(pk=chatRoomUser.user_id)
-        result_room["users"].append({"user_id": str(chatUser.id), "state": chatRoomUser.state, 'username': chatUser.username})
+"""
+Returns the newest limit messages of each of given rooms (UUIDs), newest first, as a dictionary from room id to a list
+of dictionaries with the fields of MESSAGE_VALUES. One more message than limit is returned for rooms which have
+more so that callers can tell whether an older page exists. Uses a single lateral query walking the
+(chat_room, created_time, id) index of each room, so the cost does not depend on the size of the rooms.
+WARNING: Must be called within transaction context.
+"""
+
+def get_latest_messages_by_room(room_ids, limit, using=DEFAULT_DB_ALIAS):
+    query = """
+        SELECT m.id, m.chat_room_id, m.sender_id, m.created_time, m.text, m.seq
+        FROM unnest(%s::uuid[]) AS r(room_id)
+        CROSS JOIN LATERAL (
+            SELECT id, chat_room_id, sender_id, created_time, text, seq FROM {table}
+            WHERE chat_room_id = r.room_id
+            ORDER BY created_time DESC, id DESC
+            LIMIT %s
+        ) m
+    """.format(table=connections[using].ops.quote_name(Message._meta.db_table))
+
+    messages_by_room = {room_id: [] for room_id in room_ids}
+    with connections[using].cursor() as cursor:
+        cursor.execute(query, [[str(room_id) for room_id in room_ids], limit + 1])
+        for message_id, room_id, sender_id, created_time, text, seq in cursor.fetchall():
+            messages_by_room[room_id].append({"id": message_id, "sender_id": sender_id, "created_time": created_time, "text": text, "seq": seq})
+    return messages_by_room
+
+"""
+Returns the read watermarks of the members of given rooms as a dictionary from room id to a list of
+(user_id, last_read_seq). A member has read every message of the room with a sequence number up to their watermark.
+WARNING: Must be called within transaction context.
+"""
 
-    return result_room
+def get_read_watermarks(room_ids):
+    read_watermarks = {room_id: [] for room_id in room_ids}
+    for room_id, user_id, last_read_seq in ChatRoomUser.objects.filter(chat_room_id__in=room_ids).values_list('chat_room_id', 'user_id', 'last_read_seq'):
+        read_watermarks[room_id].append((user_id, last_read_seq))
+    return read_watermarks
 
 def create_success_resp():
     return create_error_message_resp()
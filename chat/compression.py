@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+"""
+Returns the content codings accepted by given Accept-Encoding header, without those refused with q=0.
+"""
+
+def accepted_encodings(header):
+    encodings = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip().replace(' ', '')
+        if q in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+"""
+Middleware compressing responses of at least COMPRESSION_MIN_SIZE bytes with brotli when installed and accepted
+by the client, else with gzip. Same as Django's GZipMiddleware otherwise: streaming responses and responses which
+do not shrink are left alone, and strong ETags are made weak. Supports both sync and async requests.
+"""
+
+class CompressionMiddleware(MiddlewareMixin):
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def process_response(self, request, response):
+        if response.streaming or len(response.content) < self.min_size or response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in encodings:
+            # Quality 5 compresses better than gzip while staying cheap enough for dynamic responses.
+            encoding, content = 'br', brotli.compress(response.content, quality=5)
+        elif 'gzip' in encodings:
+            encoding, content = 'gzip', compress_string(response.content)
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
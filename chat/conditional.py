@@ -0,0 +1,44 @@
+import hashlib
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+# Last-Modified has a resolution of one second, so it is only sent for changes older than this. Otherwise a change
+# made later within the same second would be hidden from clients revalidating with If-Modified-Since.
+LAST_MODIFIED_MIN_AGE = timedelta(seconds=1)
+
+"""
+Validators of a response computed from cheap lookups before the response is built. The ETag covers given
+state, the requesting user, the query string and the negotiated media type, so that each page, user and format
+has its own validator.
+"""
+
+class Validators:
+
+    def __init__(self, request, state, last_modified=None):
+        digest = hashlib.sha1(repr((str(request.user.id), request.get_full_path(), getattr(request, 'accepted_media_type', None), state)).encode()).hexdigest()
+        self.etag = quote_etag(digest)
+        self.last_modified = None
+        if last_modified is not None and timezone.now() - last_modified >= LAST_MODIFIED_MIN_AGE:
+            self.last_modified = last_modified
+
+    """
+    Returns a 304 Not Modified response if the client's copy matches If-None-Match or If-Modified-Since, else None.
+    """
+
+    def not_modified(self, request):
+        last_modified = None if self.last_modified is None else int(self.last_modified.timestamp())
+        response = get_conditional_response(request, etag=self.etag, last_modified=last_modified)
+        return None if response is None else self.set_headers(response)
+
+    """
+    Set the validator headers on given response.
+    """
+
+    def set_headers(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified.timestamp())
+        return response
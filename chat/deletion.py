@@ -0,0 +1,161 @@
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from chat.archive import erase_archived_messages
+from chat.authentication import revoke_signed_tokens
+from chat.common import ChatRoomUserState
+from chat.models import AccountDeletion, ChatRoom, ChatRoomUser, InboxEntry, Message, Post, User
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of messages or posts deleted in one transaction.
+BATCH_SIZE = 1000
+
+# Delay before retrying a purge that failed. Doubles with every failed attempt up to MAX_RETRY_DELAY.
+BASE_RETRY_DELAY = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+# Claimed deletions are not picked up by other workers for this long. The lease is renewed with every batch, and
+# deletions of a worker that dies while purging are resumed once it expires.
+LEASE = timedelta(minutes=5)
+
+"""
+Disable given user's account and queue its purge. The user can no longer log in and all their auth tokens are
+revoked, but their rooms, messages and posts are left to the purge_deleted_accounts command. Requesting the
+deletion of an account already queued does nothing more.
+WARNING: Must be called within transaction context.
+"""
+
+def request_account_deletion(user):
+    user.is_active = False
+    user.save(update_fields=['is_active', 'last_updated_time'])
+    revoke_signed_tokens(user)
+    Token.objects.filter(user_id=user.pk).delete()
+    AccountDeletion.objects.get_or_create(user_id=user.pk)
+
+"""
+Returns the delay before retrying a purge that failed given number of times, with jitter.
+"""
+
+def retry_delay(attempts):
+    delay = min(BASE_RETRY_DELAY * (2 ** (attempts - 1)), MAX_RETRY_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+"""
+Claim the pending deletion due first by leasing it to this worker. Returns None if no deletion is due.
+"""
+
+def claim_deletion():
+    now = timezone.now()
+    with transaction.atomic():
+        deletion = (
+            AccountDeletion.objects.filter(completed_time__isnull=True, next_attempt_time__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_time')
+            .first()
+        )
+        if deletion is not None:
+            AccountDeletion.objects.filter(pk=deletion.pk).update(next_attempt_time=now + LEASE)
+    return deletion
+
+"""
+Delete the next batch of data of given deleted account in its own transaction, along with the progress of the
+deletion. Returns True once the account is fully purged.
+
+Rooms of the user are purged one at a time: the other members are removed first so that the room no longer
+receives messages, and their inbox entries are hidden and emptied but kept as tombstones, so that sync/ and
+chats/ report the removal of the room. Messages are then deleted in batches, and archived messages are erased
+from the archive files. The room is emptied last and the membership of the user marked DELETED, which is how the
+purge skips the room after a restart. The room and its tombstones are deleted by purge_expired_rooms once no sync
+token from before the purge is valid anymore. Posts follow in batches and the user row last. Every step only
+deletes what is left, so a purge interrupted at any point resumes where it stopped.
+"""
+
+def purge_batch(deletion, batch_size=BATCH_SIZE):
+    user_id = deletion.user_id
+    progress = AccountDeletion.objects.filter(pk=deletion.pk)
+    with transaction.atomic():
+        # Renew the lease of this worker.
+        progress.update(next_attempt_time=timezone.now() + LEASE)
+
+        chat_room_id = ChatRoomUser.objects.filter(user_id__exact=user_id).exclude(state=ChatRoomUserState.DELETED.name).values_list('chat_room_id', flat=True).first()
+        if chat_room_id is not None:
+            num_removed, _ = ChatRoomUser.objects.filter(chat_room_id=chat_room_id).exclude(user_id=user_id).delete()
+            if num_removed > 0:
+                InboxEntry.objects.filter(chat_room_id=chat_room_id).exclude(user_id=user_id).update(
+                    visible=False, num_unread_messages=0, last_message_sender_id=None, last_message_text='', last_message_time=None, last_updated_time=timezone.now(),
+                )
+
+            message_ids = list(Message.objects.filter(chat_room_id=chat_room_id).values_list('id', flat=True)[:batch_size])
+            if len(message_ids) > 0:
+                num_deleted, _ = Message.objects.filter(id__in=message_ids).delete()
+                progress.update(num_messages_deleted=F('num_messages_deleted') + num_deleted)
+            else:
+                num_erased = erase_archived_messages(chat_room_id)
+                ChatRoom.objects.filter(pk=chat_room_id).update(name='', last_message_sender_id=None, last_message_text='', last_message_time=None, last_updated_time=timezone.now())
+                InboxEntry.objects.filter(chat_room_id=chat_room_id, user_id=user_id).delete()
+                ChatRoomUser.objects.filter(chat_room_id=chat_room_id, user_id=user_id).update(state=ChatRoomUserState.DELETED.name)
+                progress.update(num_rooms_deleted=F('num_rooms_deleted') + 1, num_messages_deleted=F('num_messages_deleted') + num_erased)
+            return False
+
+        post_ids = list(Post.objects.filter(creator_user_id=user_id).values_list('id', flat=True)[:batch_size])
+        if len(post_ids) > 0:
+            num_deleted, _ = Post.objects.filter(id__in=post_ids).delete()
+            progress.update(num_posts_deleted=F('num_posts_deleted') + num_deleted)
+            return False
+
+        # Cascades to the feedback and auth token of the user.
+        User.objects.filter(pk=user_id).delete()
+        progress.update(completed_time=timezone.now())
+        return True
+
+"""
+Delete up to batch_size rooms purged by purge_batch more than SYNC_TOKEN_MAX_AGE ago, along with the tombstones
+left in the inbox of their former members. Returns the number of rooms deleted.
+"""
+
+def purge_expired_rooms(batch_size=BATCH_SIZE):
+    cutoff = timezone.now() - timedelta(seconds=settings.SYNC_TOKEN_MAX_AGE)
+    with transaction.atomic():
+        room_ids = list(
+            ChatRoomUser.objects.filter(state=ChatRoomUserState.DELETED.name, chat_room__last_updated_time__lt=cutoff)
+            .values_list('chat_room_id', flat=True)[:batch_size]
+        )
+        # Cascades to the tombstones and the membership of the deleted user.
+        ChatRoom.objects.filter(pk__in=room_ids).delete()
+    return len(room_ids)
+
+"""
+Purge accounts whose deletion is due, one batch at a time, until none is due or max_batches batches were
+deleted. Returns the number of batches deleted. A deletion failing with a database error is retried later
+with backoff.
+"""
+
+def purge_deleted_accounts(batch_size=BATCH_SIZE, max_batches=None):
+    num_batches = 0
+    while max_batches is None or num_batches < max_batches:
+        deletion = claim_deletion()
+        if deletion is None:
+            break
+
+        try:
+            while max_batches is None or num_batches < max_batches:
+                num_batches += 1
+                if purge_batch(deletion, batch_size):
+                    logger.info("Purged account %s", deletion.user_id)
+                    break
+            else:
+                # Out of batches, let the deletion be claimed again right away.
+                AccountDeletion.objects.filter(pk=deletion.pk).update(next_attempt_time=timezone.now())
+        except DatabaseError as e:
+            attempts = deletion.attempts + 1
+            logger.warning("Failed to purge account %s (attempt %d): %s", deletion.user_id, attempts, e)
+            AccountDeletion.objects.filter(pk=deletion.pk).update(attempts=attempts, last_error=str(e), next_attempt_time=timezone.now() + retry_delay(attempts))
+    return num_batches
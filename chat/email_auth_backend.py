@@ -1,8 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
 from django.conf import settings
-from django.core.mail import send_mail
-from chat.models import User
+from chat.models import OutboxEmail, User
 import random
 
 class EmailBackend(ModelBackend):
@@ -19,6 +18,7 @@ class EmailBackend(ModelBackend):
 
 """
 Send verification email with OTP (one time pin for given user).
+The email is written to the outbox and delivered once the transaction commits by the send_outbox_emails command.
 Must be called within transaction context.
 """
 
@@ -33,5 +33,5 @@ def verify_email(user: User):
     user.otp = otp
     user.save()
 
-    # Send email.
-    send_mail(subject, message, from_email, [user.email])
\ No newline at end of file
+    # Queue email.
+    OutboxEmail(subject=subject, body=message, from_email=from_email, to_email=user.email).save()
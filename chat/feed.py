@@ -0,0 +1,106 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from chat.models import Post, PostDeletionCounter, User
+
+# Cache key of the current version of the posts feed. Bumping it invalidates every cached page at once.
+FEED_VERSION_KEY = 'chat.feed.version'
+
+# Seconds a request waits for another request rebuilding the same page before building it itself.
+REBUILD_WAIT = 2
+REBUILD_POLL_INTERVAL = 0.02
+
+"""
+Returns the current version of the posts feed, creating it if missing.
+"""
+
+def get_feed_version():
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        cache.add(FEED_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(FEED_VERSION_KEY)
+    return version
+
+"""
+Returns the state of the posts feed read from the database: the creation time and id of the newest post, the
+number of statements which deleted posts and the last time a user changed. It changes with every post created or
+deleted and every username change, made by any process, so unlike the feed version it can validate responses
+without a shared cache. Each part is a single index or row lookup, whatever the number of posts.
+"""
+
+def get_feed_state():
+    newest = Post.objects.order_by('-created_time', '-id').values_list('created_time', 'id').first()
+    deletions = PostDeletionCounter.objects.values_list('count', flat=True).first()
+    updated = User.objects.order_by('-last_updated_time').values_list('last_updated_time', flat=True).first()
+    return (newest, deletions, updated)
+
+"""
+Invalidate every cached page of the posts feed once the current transaction commits, so that a page rebuilt
+in between is never cached with uncommitted or stale data.
+"""
+
+def invalidate_feed():
+    transaction.on_commit(lambda: cache.set(FEED_VERSION_KEY, uuid.uuid4().hex, None))
+
+def page_key(version, cursor):
+    return 'chat.feed.%s.%s' % (version, 'head' if cursor is None else hashlib.sha1(cursor.encode()).hexdigest())
+
+def depth_key(version, cursor):
+    return page_key(version, cursor) + '.depth'
+
+"""
+Returns the cached posts feed page at given cursor, built by build() on a miss, or None if the page is not one of
+the first FEED_CACHED_PAGES pages. Pages are (posts, next_cursor, prev_cursor). Concurrent misses on the same page
+are coalesced so that a single request rebuilds it while the others wait for the result.
+"""
+
+def get_feed_page(cursor, build):
+    version = get_feed_version()
+    if cursor is None:
+        depth = 0
+    else:
+        # Only cursors issued by a cached page are cached.
+        depth = cache.get(depth_key(version, cursor))
+        if depth is None:
+            return None
+
+    key = page_key(version, cursor)
+    page = cache.get(key)
+    if page is None:
+        page = rebuild_page(key, build)
+
+    next_cursor = page[1]
+    if next_cursor is not None and depth + 1 < getattr(settings, 'FEED_CACHED_PAGES', 3):
+        cache.add(depth_key(version, next_cursor), depth + 1, getattr(settings, 'FEED_CACHE_TIMEOUT', 60))
+    return page
+
+def rebuild_page(key, build):
+    lock_key = key + '.lock'
+    if cache.add(lock_key, True, REBUILD_WAIT * 2):
+        try:
+            page = build()
+            cache.set(key, page, getattr(settings, 'FEED_CACHE_TIMEOUT', 60))
+            return page
+        finally:
+            cache.delete(lock_key)
+
+    # Another request is rebuilding the page.
+    deadline = time.monotonic() + REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        page = cache.get(key)
+        if page is not None:
+            return page
+    return build()
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_feed_on_post_change(sender, **kwargs):
+    invalidate_feed()
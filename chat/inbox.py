@@ -0,0 +1,101 @@
+from django.db.models import BigIntegerField, Case, F, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from chat.common import ChatRoomUserState, MESSAGE_PREVIEW_LENGTH, get_users_by_room
+from chat.models import ChatRoomUser, InboxEntry
+
+# Fields of inbox entries read with values() to build chat room responses, without instantiating models.
+INBOX_RESPONSE_FIELDS = ('id', 'chat_room_id', 'chat_room__name', 'visible', 'sort_time', 'num_unread_messages', 'last_message_sender_id', 'last_message_text', 'last_message_time')
+
+"""
+Returns True if the chat room should be shown in the chat list of given user. A room is shown
+when no member has rejected it and some other member has joined it.
+"""
+
+def is_visible_in_inbox(user_id, states_by_user_id):
+    if ChatRoomUserState.REJECTED.name in states_by_user_id.values():
+        return False
+    return any(state == ChatRoomUserState.JOINED.name for other_id, state in states_by_user_id.items() if other_id != user_id)
+
+"""
+Create inbox entries for all users of a newly created chat room. Must be called after the room's users
+and initial message are saved.
+WARNING: Must be called within transaction context.
+"""
+
+def create_inbox_entries(chat_room, chat_room_users):
+    states_by_user_id = {cru.user_id: cru.state for cru in chat_room_users}
+    InboxEntry.objects.bulk_create([
+        InboxEntry(
+            user_id=cru.user_id,
+            chat_room=chat_room,
+            visible=is_visible_in_inbox(cru.user_id, states_by_user_id),
+            sort_time=Now(),
+            num_unread_messages=chat_room.last_message_seq - cru.last_read_seq,
+            last_message_sender_id=chat_room.last_message_sender_id,
+            last_message_text=chat_room.last_message_text,
+            last_message_time=chat_room.last_message_time,
+        )
+        for cru in chat_room_users
+    ])
+
+"""
+Recompute visibility of the inbox entries of a chat room after the state of one of its users changed.
+WARNING: Must be called within transaction context.
+"""
+
+def update_inbox_visibility(chat_room):
+    states_by_user_id = dict(ChatRoomUser.objects.filter(chat_room=chat_room).values_list('user_id', 'state'))
+    for user_id in states_by_user_id:
+        InboxEntry.objects.filter(chat_room=chat_room, user_id=user_id).update(visible=is_visible_in_inbox(user_id, states_by_user_id), last_updated_time=timezone.now())
+
+"""
+Update the inbox entries of all users of the chat room with given new message.
+The message is unread for every user except the sender.
+WARNING: Must be called within transaction context.
+"""
+
+def update_inbox_for_message(chat_room, message):
+    InboxEntry.objects.filter(chat_room=chat_room).update(
+        sort_time=Now(),
+        num_unread_messages=Case(When(user_id=message.sender_id, then=F('num_unread_messages')), default=F('num_unread_messages') + 1),
+        last_message_sender_id=message.sender_id,
+        last_message_text=message.text[:MESSAGE_PREVIEW_LENGTH],
+        last_message_time=message.created_time,
+        last_updated_time=timezone.now(),
+    )
+
+"""
+Mark the inbox entry of given user in the chat room as read. Entries of the other users are touched as well
+since the read marker of the user changed for them.
+WARNING: Must be called within transaction context.
+"""
+
+def mark_inbox_read(chat_room, user_id):
+    InboxEntry.objects.filter(chat_room=chat_room).update(
+        num_unread_messages=Case(When(user_id=user_id, then=0), default=F('num_unread_messages'), output_field=BigIntegerField()),
+        last_updated_time=timezone.now(),
+    )
+
+"""
+Returns list of dictionary objects of chat rooms for given inbox entries, in the same order.
+Inbox entries are values() dicts with the INBOX_RESPONSE_FIELDS.
+WARNING: Must be called within transaction context.
+"""
+
+def create_inbox_responses(inbox_entries):
+    room_ids = [entry['chat_room_id'] for entry in inbox_entries]
+    if len(room_ids) == 0:
+        return []
+
+    users_by_room = get_users_by_room(list(ChatRoomUser.objects.filter(chat_room__id__in=room_ids).values('chat_room_id', 'user_id', 'state')))
+
+    results = []
+    for entry in inbox_entries:
+        last_message_dict = None
+        if entry['last_message_time'] is not None:
+            last_message_dict = {"sender_id": entry['last_message_sender_id'], "text": entry['last_message_text'], "created_time": entry['last_message_time']}
+
+        results.append({"room_id": str(entry['chat_room_id']), "name": entry['chat_room__name'], "last_updated_time": entry['sort_time'], "last_message": last_message_dict, "users": users_by_room.get(entry['chat_room_id'], []), "num_unread_messages": entry['num_unread_messages']})
+    return results
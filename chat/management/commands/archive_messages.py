@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.archive import archive_old_partitions, ensure_message_partitions
+
+
+class Command(BaseCommand):
+    help = "Create the upcoming monthly partitions of the message table and archive the partitions of old months."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hot-months', type=int, default=settings.MESSAGE_HOT_MONTHS, help="Months of messages kept in the database before the current month.")
+        parser.add_argument('--months-ahead', type=int, default=settings.MESSAGE_PARTITION_MONTHS_AHEAD, help="Months after the current month to create partitions for.")
+
+    def handle(self, *args, **options):
+        for name in ensure_message_partitions(options['months_ahead']):
+            self.stdout.write("Created partition %s" % name)
+        for archive in archive_old_partitions(options['hot_months']):
+            self.stdout.write("Archived %d messages of %s to %s" % (archive.num_messages, archive.partition, archive.path))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.deletion import BATCH_SIZE, purge_deleted_accounts, purge_expired_rooms
+
+
+class Command(BaseCommand):
+    help = "Purge the rooms, messages and posts of deleted accounts in bounded batches, and delete the rooms they left behind once expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Purge the accounts currently due and exit.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds to wait when no account is due.")
+
+    def handle(self, *args, **options):
+        while True:
+            num_batches = purge_deleted_accounts(batch_size=options['batch_size'])
+            if num_batches > 0:
+                self.stdout.write("Deleted %d batches" % num_batches)
+            num_rooms = purge_expired_rooms(batch_size=options['batch_size'])
+            if num_rooms > 0:
+                self.stdout.write("Deleted %d expired rooms" % num_rooms)
+            if options['once']:
+                break
+            if num_batches == 0 and num_rooms == 0:
+                time.sleep(options['poll_interval'])
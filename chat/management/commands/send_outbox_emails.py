@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.outbox import BATCH_SIZE, open_connection, send_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver emails queued in the outbox, reusing one mail connection across batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send the emails currently due and exit.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait when no email is due.")
+
+    def handle(self, *args, **options):
+        connection = None
+        try:
+            while True:
+                try:
+                    if connection is None:
+                        connection = open_connection()
+                    num_sent = send_outbox(connection, batch_size=options['batch_size'])
+                except OSError as e:
+                    # Connection to the mail server failed, reconnect on the next round.
+                    self.stderr.write("Mail connection failed: %s" % e)
+                    if connection is not None:
+                        connection.close()
+                    connection = None
+                    num_sent = 0
+
+                if num_sent > 0:
+                    self.stdout.write("Sent %d emails" % num_sent)
+                if options['once']:
+                    break
+                if num_sent == 0:
+                    time.sleep(options['poll_interval'])
+        finally:
+            if connection is not None:
+                connection.close()
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+def backfill_message_sequence(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatRoomUser = apps.get_model('chat', 'ChatRoomUser')
+    Message = apps.get_model('chat', 'Message')
+
+    for chat_room in ChatRoom.objects.iterator():
+        messages = list(Message.objects.filter(chat_room=chat_room).order_by('created_time', 'id'))
+        for seq, message in enumerate(messages, start=1):
+            message.seq = seq
+        Message.objects.bulk_update(messages, ['seq'], batch_size=1000)
+
+        if len(messages) > 0:
+            last_message = messages[-1]
+            chat_room.last_message_seq = last_message.seq
+            chat_room.last_message_sender_id = last_message.sender_id
+            chat_room.last_message_text = last_message.text[:200]
+            chat_room.last_message_time = last_message.created_time
+            chat_room.save(update_fields=['last_message_seq', 'last_message_sender_id', 'last_message_text', 'last_message_time'])
+
+        for chat_room_user in ChatRoomUser.objects.filter(chat_room=chat_room).exclude(last_read_time__isnull=True):
+            chat_room_user.last_read_seq = sum(1 for message in messages if message.created_time <= chat_room_user.last_read_time)
+            chat_room_user.save(update_fields=['last_read_seq'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_rename_is_verified_user_email_verified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_sender_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_text',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_time',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroomuser',
+            name='last_read_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_message_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:08
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def backfill_inbox_entries(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatRoomUser = apps.get_model('chat', 'ChatRoomUser')
+    InboxEntry = apps.get_model('chat', 'InboxEntry')
+
+    for chat_room in ChatRoom.objects.iterator():
+        chat_room_users = {cru.user_id: cru for cru in ChatRoomUser.objects.filter(chat_room=chat_room)}
+        rejected = any(cru.state == 'REJECTED' for cru in chat_room_users.values())
+        entries = []
+        for user_id, cru in chat_room_users.items():
+            other_joined = any(other.state == 'JOINED' for other_id, other in chat_room_users.items() if other_id != user_id)
+            entries.append(InboxEntry(
+                user_id=user_id,
+                chat_room=chat_room,
+                visible=not rejected and other_joined,
+                sort_time=chat_room.last_updated_time,
+                num_unread_messages=chat_room.last_message_seq - cru.last_read_seq,
+                last_message_sender_id=chat_room.last_message_sender_id,
+                last_message_text=chat_room.last_message_text,
+                last_message_time=chat_room.last_message_time,
+            ))
+        InboxEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_message_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField(default=uuid.uuid4, editable=False)),
+                ('visible', models.BooleanField(default=False)),
+                ('sort_time', models.DateTimeField(null=True)),
+                ('num_unread_messages', models.BigIntegerField(default=0)),
+                ('last_message_sender_id', models.UUIDField(null=True)),
+                ('last_message_text', models.TextField(default='')),
+                ('last_message_time', models.DateTimeField(null=True)),
+                ('last_updated_time', models.DateTimeField(auto_now=True)),
+                ('chat_room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chat.chatroom')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'visible', '-sort_time'], name='chat_inbox_user_sort_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_inbox_entries, migrations.RunPython.noop),
+    ]
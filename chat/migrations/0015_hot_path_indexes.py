@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0014_inboxentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['-last_updated_time'], name='chat_room_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroomuser',
+            index=models.Index(fields=['user_id', 'state'], include=('chat_room',), name='chat_roomuser_user_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroomuser',
+            index=models.Index(fields=['chat_room', 'user_id'], name='chat_roomuser_room_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat_room', '-created_time'], name='chat_message_room_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_time'], name='chat_post_created_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0015_hot_path_indexes'),
+    ]
+
+    # Keyset pagination orders by (time, id), so the indexes of 0014 and 0015 are recreated ending with id.
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inboxentry',
+            name='chat_inbox_user_sort_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='chat_message_room_time_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='chat_post_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='inboxentry',
+            index=models.Index(fields=['user_id', 'visible', '-sort_time', '-id'], name='chat_inbox_user_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat_room', '-created_time', '-id'], name='chat_message_room_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_time', '-id'], name='chat_post_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0016_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inboxentry',
+            index=models.Index(fields=['user_id', 'last_updated_time'], name='chat_inbox_user_updated_idx'),
+        ),
+    ]
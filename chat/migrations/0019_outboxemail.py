@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:16
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0018_signed_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('subject', models.TextField()),
+                ('body', models.TextField()),
+                ('from_email', models.EmailField(max_length=254)),
+                ('to_email', models.EmailField(max_length=254)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('sent_time', models.DateTimeField(null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(default='')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('sent_time__isnull', True)), fields=['next_attempt_time'], name='chat_outbox_pending_idx')],
+            },
+        ),
+    ]
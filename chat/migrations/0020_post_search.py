@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:29
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Keeps the search document of a post in sync with its title and description on every write, including writes
+# which bypass the ORM.
+CREATE_SEARCH_VECTOR_TRIGGER = """
+CREATE FUNCTION chat_post_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_post_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON chat_post
+    FOR EACH ROW EXECUTE FUNCTION chat_post_search_vector_update();
+
+UPDATE chat_post SET title = title;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER chat_post_search_vector_trigger ON chat_post;
+DROP FUNCTION chat_post_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0019_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='chat_post_search_idx'),
+        ),
+    ]
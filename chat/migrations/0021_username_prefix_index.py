@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:33
+
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('chat', '0020_post_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate(django.db.models.functions.text.Upper('username'), 'C'), name='chat_user_username_prefix_idx'),
+        ),
+    ]
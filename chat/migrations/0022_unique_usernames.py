@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:34
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def release_duplicate_usernames(apps, schema_editor):
+    User = apps.get_model('chat', 'User')
+
+    # Usernames claimed concurrently before uniqueness was enforced are kept by the user who joined first. The
+    # other users get an empty username and are asked to pick a new one.
+    duplicates = User.objects.exclude(username='').values('username').annotate(num_users=Count('id')).filter(num_users__gt=1)
+    for duplicate in duplicates:
+        users = User.objects.filter(username=duplicate['username']).order_by('date_joined', 'id')
+        User.objects.filter(id__in=[user.id for user in users[1:]]).update(username='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('chat', '0021_username_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['last_updated_time'], name='chat_user_updated_idx'),
+        ),
+        migrations.RunPython(release_duplicate_usernames, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('username', ''), _negated=True), fields=('username',), name='chat_user_username_unique'),
+        ),
+    ]
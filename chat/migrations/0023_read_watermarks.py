@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:36
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def compact_read_metadata(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatRoomUser = apps.get_model('chat', 'ChatRoomUser')
+    InboxEntry = apps.get_model('chat', 'InboxEntry')
+    UserMessageMetadata = apps.get_model('chat', 'UserMessageMetadata')
+
+    # Every message a user read up to the newest one is covered by the read watermark of their membership.
+    watermarks = UserMessageMetadata.objects.values('user_id', 'message__chat_room_id').annotate(max_seq=Max('message__seq'), max_read_time=Max('read_time'))
+    for watermark in watermarks.iterator():
+        chat_room_users = ChatRoomUser.objects.filter(user_id=watermark['user_id'], chat_room_id=watermark['message__chat_room_id'])
+        chat_room_users.filter(last_read_seq__lt=watermark['max_seq']).update(last_read_seq=watermark['max_seq'])
+        chat_room_users.filter(last_read_time__isnull=True).update(last_read_time=watermark['max_read_time'])
+        chat_room_users.filter(last_read_time__lt=watermark['max_read_time']).update(last_read_time=watermark['max_read_time'])
+
+        last_read_seq = chat_room_users.values_list('last_read_seq', flat=True).first()
+        if last_read_seq is not None:
+            last_message_seq = ChatRoom.objects.filter(id=watermark['message__chat_room_id']).values_list('last_message_seq', flat=True).first()
+            InboxEntry.objects.filter(user_id=watermark['user_id'], chat_room_id=watermark['message__chat_room_id']).update(num_unread_messages=max(0, last_message_seq - last_read_seq))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0022_unique_usernames'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_read_metadata, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='UserMessageMetadata',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:02
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0023_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDeletion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField(editable=False, unique=True)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('completed_time', models.DateTimeField(null=True)),
+                ('num_rooms_deleted', models.BigIntegerField(default=0)),
+                ('num_messages_deleted', models.BigIntegerField(default=0)),
+                ('num_posts_deleted', models.BigIntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(default='')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('completed_time__isnull', True)), fields=['next_attempt_time'], name='chat_deletion_pending_idx')],
+            },
+        ),
+    ]
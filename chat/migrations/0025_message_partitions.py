@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:41
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+# Rebuilds the message table range partitioned by created_time, with one partition per month (in UTC) from the
+# oldest message to three months ahead and a default partition catching anything else. The primary key has to
+# include the partition key. The index on chat_room_id alone is not recreated, chat_message_room_time_idx covers it.
+# Later partitions are created by the archive_messages command. Copies every message, so run it during a quiet
+# period on large tables.
+PARTITION_MESSAGES = """
+CREATE TABLE chat_message_partitioned (LIKE chat_message INCLUDING DEFAULTS) PARTITION BY RANGE (created_time);
+CREATE TABLE chat_message_default PARTITION OF chat_message_partitioned DEFAULT;
+
+DO $$
+DECLARE
+    month timestamp := date_trunc('month', coalesce((SELECT min(created_time) FROM chat_message), now()) AT TIME ZONE 'UTC');
+    last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months';
+BEGIN
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF chat_message_partitioned FOR VALUES FROM (%L) TO (%L)',
+            'chat_message_p' || to_char(month, 'YYYYMM'), month AT TIME ZONE 'UTC', (month + interval '1 month') AT TIME ZONE 'UTC'
+        );
+        month := month + interval '1 month';
+    END LOOP;
+END
+$$;
+
+INSERT INTO chat_message_partitioned SELECT * FROM chat_message;
+DROP TABLE chat_message;
+ALTER TABLE chat_message_partitioned RENAME TO chat_message;
+
+ALTER TABLE chat_message ADD CONSTRAINT chat_message_pkey PRIMARY KEY (id, created_time);
+ALTER TABLE chat_message ADD CONSTRAINT chat_message_chat_room_id_bee2301e_fk_chat_chatroom_id
+    FOREIGN KEY (chat_room_id) REFERENCES chat_chatroom (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX chat_message_room_time_idx ON chat_message (chat_room_id, created_time DESC, id DESC);
+"""
+
+# Messages of archived partitions are not restored.
+UNPARTITION_MESSAGES = """
+CREATE TABLE chat_message_unpartitioned (LIKE chat_message INCLUDING DEFAULTS);
+INSERT INTO chat_message_unpartitioned SELECT * FROM chat_message;
+DROP TABLE chat_message;
+ALTER TABLE chat_message_unpartitioned RENAME TO chat_message;
+
+ALTER TABLE chat_message ADD CONSTRAINT chat_message_pkey PRIMARY KEY (id);
+ALTER TABLE chat_message ADD CONSTRAINT chat_message_chat_room_id_bee2301e_fk_chat_chatroom_id
+    FOREIGN KEY (chat_room_id) REFERENCES chat_chatroom (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX chat_message_chat_room_id_bee2301e ON chat_message (chat_room_id);
+CREATE INDEX chat_message_room_time_idx ON chat_message (chat_room_id, created_time DESC, id DESC);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0024_accountdeletion'),
+    ]
+
+    operations = [
+        # The rebuilt table has no index on chat_room_id alone, so the state drops the index of the foreign key too.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunSQL(PARTITION_MESSAGES, UNPARTITION_MESSAGES)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='message',
+                    name='chat_room',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='chat.chatroom'),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MessageArchive',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('partition', models.CharField(max_length=63, unique=True)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('path', models.TextField()),
+                ('num_messages', models.BigIntegerField(default=0)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedMessageSegment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('offset', models.BigIntegerField()),
+                ('length', models.BigIntegerField()),
+                ('num_messages', models.BigIntegerField()),
+                ('oldest_created_time', models.DateTimeField()),
+                ('newest_created_time', models.DateTimeField()),
+                ('chat_room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chat.chatroom')),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chat.messagearchive')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['chat_room', '-newest_created_time'], name='chat_archive_segment_room_idx')],
+            },
+        ),
+    ]
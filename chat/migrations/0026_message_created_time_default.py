@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0025_message_partitions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='created_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
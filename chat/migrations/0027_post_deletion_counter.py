@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:29
+
+from django.db import migrations, models
+
+# Counts every statement deleting posts, including deletes which bypass the ORM. The row is created on demand so
+# that it survives tables being emptied.
+CREATE_POST_DELETION_TRIGGER = """
+CREATE FUNCTION chat_post_deletion_count() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO chat_postdeletioncounter (id, count) VALUES (1, 1)
+        ON CONFLICT (id) DO UPDATE SET count = chat_postdeletioncounter.count + 1;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_post_deletion_trigger
+    AFTER DELETE ON chat_post
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_post_deletion_count();
+"""
+
+DROP_POST_DELETION_TRIGGER = """
+DROP TRIGGER chat_post_deletion_trigger ON chat_post;
+DROP FUNCTION chat_post_deletion_count();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0026_message_created_time_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostDeletionCounter',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(CREATE_POST_DELETION_TRIGGER, DROP_POST_DELETION_TRIGGER),
+    ]
@@ -1,12 +1,20 @@
 import uuid
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Collate, Upper
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 
+# Text search configuration of the search document of posts.
+POST_SEARCH_CONFIG = 'english'
+
 """
 Ensure that token is generated and saved for every new user object created.
 """
@@ -24,8 +32,8 @@ class User(AbstractUser):
     # Primary key uniquely identifying the user.
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
-    # Username. Making it non unqiue since we don't want to enforce it during sign up.
-    # We may enforce uniqueness afterwards when the user creates their profile.
+    # Username. Empty until the user sets it after sign up, so uniqueness is only enforced for set usernames
+    # (see Meta.constraints).
     username = models.CharField(db_index=True, unique=False, max_length=150)
 
     # Email Address of the user.
@@ -40,9 +48,41 @@ class User(AbstractUser):
     # Set to True if user's email is verified and False otherwise.
     email_verified = models.BooleanField(default=False)
 
+    # Version of the signed auth tokens issued to the user. Tokens with an older version are revoked.
+    token_version = models.IntegerField(default=0)
+
     USERNAME_FIELD: str = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case insensitive prefix search of usernames in username order (see chat.search.search_usernames).
+            # The C collation makes the index usable both for LIKE prefix matching and for ordering.
+            models.Index(Collate(Upper('username'), 'C'), name='chat_user_username_prefix_idx'),
+            # Incremental refresh of the username filter (see chat.usernames).
+            models.Index(fields=['last_updated_time'], name='chat_user_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['username'], condition=~Q(username=''), name='chat_user_username_unique'),
+        ]
+
+"""
+Represents revocation of the signed auth tokens of a user. Tokens of the user with a version lower than
+token_version are revoked. Rows are not tied to the User so that they outlive deleted accounts.
+"""
+
+class TokenRevocation(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Same as primary key in User table.
+    user_id = models.UUIDField(default=uuid.uuid4, editable=False)
+
+    # Minimum token version of the user which is still valid.
+    token_version = models.IntegerField()
+
+    # Timestamp when the tokens were revoked.
+    created_time = models.DateTimeField(auto_now_add=True, db_index=True)
+
 
 """
 Represents a Chat Room.
@@ -64,8 +104,27 @@ class ChatRoom(models.Model):
     # Timestamp when this Chat was last updated.
     last_updated_time = models.DateTimeField(null=True)
 
+    # Sequence number of the last message posted in the room. Incremented by one for every message.
+    last_message_seq = models.BigIntegerField(default=0)
+
+    # User who sent the last message in the room.
+    last_message_sender_id = models.UUIDField(null=True)
+
+    # Preview of the last message text in the room.
+    last_message_text = models.TextField(default='')
+
+    # Timestamp when the last message in the room was created.
+    last_message_time = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-last_updated_time'], name='chat_room_updated_idx'),
+        ]
+
 """
-Represents a Chat Message.
+Represents a Chat Message. The table is range partitioned by created_time into monthly partitions (see
+migration 0025), and partitions older than MESSAGE_HOT_MONTHS are moved to archive files (see chat.archive).
+The primary key of the table is (id, created_time) since it must include the partition key.
 """
 
 class Message(models.Model):
@@ -75,31 +134,23 @@ class Message(models.Model):
     # User who sent the chat message.
     sender_id = models.UUIDField(default=uuid.uuid4, editable=False)
 
-    # Chat Room the message is part of. 
-    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
+    # Chat Room the message is part of. Not indexed on its own, chat_message_room_time_idx covers lookups by room.
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, db_index=False)
 
-    # Timestamp when this Message was created.
-    created_time = models.DateTimeField(auto_now_add=True)
+    # Timestamp when this Message was created. Set before the message is saved so that the room can be updated with
+    # it in the same statement that assigns the sequence number (see add_message_to_chat_room).
+    created_time = models.DateTimeField(default=timezone.now, editable=False)
 
     # Message Text.
     text = models.TextField()    
 
-"""
-Represents User level metadata associated with given message.
-"""
-
-class UserMessageMetadata(models.Model):
-    # Primary key uniquely identifying the User Message.
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Sequence number of the message within its Chat Room.
+    seq = models.BigIntegerField(default=0)
 
-    # User Id (from User table). 
-    user_id = models.UUIDField(default=uuid.uuid4, editable=False)
-
-    # Chat Message associated with given User message. 
-    message = models.ForeignKey(Message, on_delete=models.CASCADE)
-
-    # Timestamp when message was read.
-    read_time = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['chat_room', '-created_time', '-id'], name='chat_message_room_time_idx'),
+        ]
 
 """
 Represents a Chat Room User.
@@ -129,6 +180,60 @@ class ChatRoomUser(models.Model):
     # Last time when the chat room was read by the user.
     last_read_time = models.DateTimeField(null=True)
 
+    # Sequence number of the last message in the chat room read by the user. This watermark is the read receipt
+    # of every message of the room up to it.
+    last_read_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Covers lookups of rooms of a user in a given state without visiting the table.
+            models.Index(fields=['user_id', 'state'], include=['chat_room'], name='chat_roomuser_user_state_idx'),
+            models.Index(fields=['chat_room', 'user_id'], name='chat_roomuser_room_user_idx'),
+        ]
+
+"""
+Represents a Chat Room in the chat list (inbox) of a user. There is one entry per Chat Room User, maintained
+when messages are posted, invites are accepted or rejected and the room is read, so that the chat list
+can be paged without joining rooms and their users. The last updated time of the entry doubles as the
+change feed of the room for the user (see SyncManager).
+"""
+
+class InboxEntry(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Same as primary key in User table.
+    user_id = models.UUIDField(default=uuid.uuid4, editable=False)
+
+    # Chat Room the entry is for.
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
+
+    # Set to True if the room is shown in the chat list of the user.
+    visible = models.BooleanField(default=False)
+
+    # Timestamp used to sort the chat list. Same as last updated time of the Chat Room.
+    sort_time = models.DateTimeField(null=True)
+
+    # Number of messages in the room not read by the user.
+    num_unread_messages = models.BigIntegerField(default=0)
+
+    # User who sent the last message in the room.
+    last_message_sender_id = models.UUIDField(null=True)
+
+    # Preview of the last message text in the room.
+    last_message_text = models.TextField(default='')
+
+    # Timestamp when the last message in the room was created.
+    last_message_time = models.DateTimeField(null=True)
+
+    # Timestamp when this row was last updated.
+    last_updated_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'visible', '-sort_time', '-id'], name='chat_inbox_user_sort_idx'),
+            models.Index(fields=['user_id', 'last_updated_time'], name='chat_inbox_user_updated_idx'),
+        ]
+
 """
 Represents a Post made by a User.
 """
@@ -152,6 +257,29 @@ class Post(models.Model):
     # Timestamp when this row was last updated.
     last_updated_time = models.DateTimeField(auto_now=True)
 
+    # Weighted full text search document of title and description. Maintained by a database trigger on write
+    # (see migration 0020) in the POST_SEARCH_CONFIG configuration.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_time', '-id'], name='chat_post_created_idx'),
+            GinIndex(fields=['search_vector'], name='chat_post_search_idx'),
+        ]
+
+"""
+Number of statements which deleted posts, maintained by a database trigger on the post table (see migration 0027)
+so that deletions made by any process, with or without the ORM, change the validators of the posts feed. Has a
+single row, created by the first deletion.
+"""
+
+class PostDeletionCounter(models.Model):
+    # Always 1.
+    id = models.IntegerField(primary_key=True)
+
+    # Number of statements which deleted posts.
+    count = models.BigIntegerField(default=0)
+
 """
 Represents feedback provided by a given user about app.
 """
@@ -168,3 +296,148 @@ class Feedback(models.Model):
 
     # Timestamp when this feedback was created.
     created_time = models.DateTimeField(auto_now_add=True)
+
+"""
+Represents an email waiting to be delivered. Emails are written in the transaction of the request that
+sends them and delivered by the send_outbox_emails command, so that requests never wait on the mail server.
+"""
+
+class OutboxEmail(models.Model):
+    # Primary key uniquely identifying the Email.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Subject of the email.
+    subject = models.TextField()
+
+    # Plain text body of the email.
+    body = models.TextField()
+
+    # Sender address.
+    from_email = models.EmailField()
+
+    # Recipient address.
+    to_email = models.EmailField()
+
+    # Timestamp when this email was created.
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    # Timestamp when this email was sent. Null until sent.
+    sent_time = models.DateTimeField(null=True)
+
+    # Number of failed delivery attempts.
+    attempts = models.IntegerField(default=0)
+
+    # Earliest time of the next delivery attempt. Also used as a lease while a worker is sending the email.
+    next_attempt_time = models.DateTimeField(default=timezone.now)
+
+    # Error of the last failed delivery attempt.
+    last_error = models.TextField(default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_time'], condition=Q(sent_time__isnull=True), name='chat_outbox_pending_idx'),
+        ]
+
+"""
+Represents the deletion of a user account. The account is disabled when deletion is requested and its chat rooms,
+messages and posts are then purged in bounded batches by the purge_deleted_accounts command (see chat.deletion).
+Counters record the progress of the purge. Rows are not tied to the User so that they outlive deleted accounts.
+"""
+
+class AccountDeletion(models.Model):
+    # Primary key uniquely identifying the Account Deletion.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Same as primary key in User table.
+    user_id = models.UUIDField(unique=True, editable=False)
+
+    # Timestamp when the deletion was requested.
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    # Timestamp when the account was fully purged. Null until then.
+    completed_time = models.DateTimeField(null=True)
+
+    # Number of chat rooms deleted so far.
+    num_rooms_deleted = models.BigIntegerField(default=0)
+
+    # Number of messages deleted so far.
+    num_messages_deleted = models.BigIntegerField(default=0)
+
+    # Number of posts deleted so far.
+    num_posts_deleted = models.BigIntegerField(default=0)
+
+    # Number of failed purge attempts.
+    attempts = models.IntegerField(default=0)
+
+    # Earliest time of the next purge attempt. Also used as a lease while a worker is purging the account.
+    next_attempt_time = models.DateTimeField(default=timezone.now)
+
+    # Error of the last failed purge attempt.
+    last_error = models.TextField(default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_time'], condition=Q(completed_time__isnull=True), name='chat_deletion_pending_idx'),
+        ]
+
+"""
+Represents a monthly partition of the Message table which was detached and written to a compressed archive file
+by the archive_messages command (see chat.archive).
+"""
+
+class MessageArchive(models.Model):
+    # Primary key uniquely identifying the Message Archive.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Name of the archived partition.
+    partition = models.CharField(max_length=63, unique=True)
+
+    # Messages of the archive were created from this timestamp, inclusive.
+    start_time = models.DateTimeField()
+
+    # Messages of the archive were created before this timestamp.
+    end_time = models.DateTimeField()
+
+    # Name of the archive file in MESSAGE_ARCHIVE_DIR.
+    path = models.TextField()
+
+    # Number of messages in the archive.
+    num_messages = models.BigIntegerField(default=0)
+
+    # Timestamp when the partition was archived.
+    created_time = models.DateTimeField(auto_now_add=True)
+
+"""
+Represents the messages of a Chat Room within a Message Archive. They are stored as one gzip member of the archive
+file, at given offset, holding one JSON message per line with the most recent message first, so that they can be
+read without decompressing the rest of the file.
+"""
+
+class ArchivedMessageSegment(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Archive holding the messages.
+    archive = models.ForeignKey(MessageArchive, on_delete=models.CASCADE)
+
+    # Chat Room the messages are part of.
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
+
+    # Offset of the segment in the archive file, in bytes.
+    offset = models.BigIntegerField()
+
+    # Length of the segment in the archive file, in bytes.
+    length = models.BigIntegerField()
+
+    # Number of messages in the segment.
+    num_messages = models.BigIntegerField()
+
+    # Timestamp of the oldest message in the segment.
+    oldest_created_time = models.DateTimeField()
+
+    # Timestamp of the most recent message in the segment.
+    newest_created_time = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['chat_room', '-newest_created_time'], name='chat_archive_segment_room_idx'),
+        ]
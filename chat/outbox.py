@@ -0,0 +1,90 @@
+import logging
+import random
+import smtplib
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from chat.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# Number of emails claimed and sent over one connection at a time.
+BATCH_SIZE = 50
+
+# Emails failing this many times are no longer retried.
+MAX_ATTEMPTS = 8
+
+# Delay before the first retry. Doubles with every failed attempt up to MAX_RETRY_DELAY.
+BASE_RETRY_DELAY = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+# Claimed emails are not picked up by other workers for this long. Emails of a worker that dies while sending
+# are retried once the lease expires.
+LEASE = timedelta(minutes=5)
+
+"""
+Returns the delay before retrying an email that failed given number of times, with jitter so that
+emails failing together are not retried together.
+"""
+
+def retry_delay(attempts):
+    delay = min(BASE_RETRY_DELAY * (2 ** (attempts - 1)), MAX_RETRY_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+"""
+Claim a batch of emails due for delivery by leasing them to this worker.
+"""
+
+def claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.filter(sent_time__isnull=True, attempts__lt=MAX_ATTEMPTS, next_attempt_time__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_time')[:batch_size]
+        )
+        OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(next_attempt_time=now + LEASE)
+    return emails
+
+"""
+Sends emails due for delivery over given open mail connection, in batches until none is due or max_batches
+batches were sent. Returns the number of emails sent. The connection is reused across batches.
+"""
+
+def send_outbox(connection, batch_size=BATCH_SIZE, max_batches=None):
+    num_sent = 0
+    num_batches = 0
+    while max_batches is None or num_batches < max_batches:
+        emails = claim_batch(batch_size)
+        if len(emails) == 0:
+            break
+        num_batches += 1
+
+        for email in emails:
+            try:
+                EmailMessage(email.subject, email.body, email.from_email, [email.to_email], connection=connection).send()
+            except OSError as e:
+                attempts = email.attempts + 1
+                logger.warning("Failed to send email %s (attempt %d): %s", email.id, attempts, e)
+                OutboxEmail.objects.filter(pk=email.id).update(attempts=attempts, last_error=str(e), next_attempt_time=timezone.now() + retry_delay(attempts))
+                if isinstance(e, smtplib.SMTPServerDisconnected) or not isinstance(e, smtplib.SMTPException):
+                    # Connection was lost, reopen it for the next email.
+                    connection.close()
+                    connection.open()
+                continue
+
+            OutboxEmail.objects.filter(pk=email.id).update(sent_time=timezone.now())
+            num_sent += 1
+    return num_sent
+
+"""
+Opens a mail connection using the configured email backend.
+"""
+
+def open_connection():
+    connection = get_connection()
+    connection.open()
+    return connection
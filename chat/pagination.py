@@ -0,0 +1,121 @@
+from datetime import datetime
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+# Direction of a cursor. NEXT pages towards older rows and PREV pages towards newer rows.
+NEXT = 'n'
+PREV = 'p'
+
+# Response headers carrying the cursors of the adjacent pages.
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+PREV_CURSOR_HEADER = 'X-Prev-Cursor'
+
+"""
+Raised when a cursor or sync token provided by the client cannot be decoded.
+"""
+
+class InvalidCursorError(Exception):
+    pass
+
+"""
+Returns an opaque signed cursor pointing at given (timestamp, id) position. The scope ties the cursor
+to the endpoint it was issued by.
+"""
+
+def encode_cursor(scope, timestamp, row_id, direction):
+    return signing.dumps([timestamp.isoformat(), str(row_id), direction], salt='chat.cursor.' + scope, compress=True)
+
+"""
+Returns (timestamp, id, direction) position of given cursor.
+"""
+
+def decode_cursor(scope, cursor):
+    try:
+        timestamp, row_id, direction = signing.loads(cursor, salt='chat.cursor.' + scope)
+        if direction not in (NEXT, PREV):
+            raise ValueError(direction)
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id), direction
+    except (signing.BadSignature, TypeError, ValueError) as e:
+        raise InvalidCursorError(str(e))
+
+"""
+Returns an opaque signed sync token for given timestamp.
+"""
+
+def encode_sync_token(timestamp):
+    return signing.dumps(timestamp.isoformat(), salt='chat.sync')
+
+"""
+Returns timestamp of given sync token. Tokens older than SYNC_TOKEN_MAX_AGE are invalid.
+"""
+
+def decode_sync_token(token):
+    try:
+        return datetime.fromisoformat(signing.loads(token, salt='chat.sync', max_age=settings.SYNC_TOKEN_MAX_AGE))
+    except (signing.BadSignature, TypeError, ValueError) as e:
+        raise InvalidCursorError(str(e))
+
+"""
+Returns given field of a model instance or values() dict.
+"""
+
+def row_value(row, field):
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+"""
+Returns a page of rows of given queryset ordered by most recent (time_field, id) first, along with
+the cursors of the next (older) and previous (newer) pages. The queryset may return model instances or values()
+dicts, which must then include id and the time field. Rows sharing a timestamp are ordered by id
+so no row is skipped or repeated across pages. The next cursor is None when there are no older rows and
+both cursors are None when the page is empty.
+Rows older than every row of the queryset can be provided by an archive (see chat.archive.ArchivedMessages),
+read once the queryset runs out of older rows.
+WARNING: Must be called within transaction context.
+"""
+
+def paginate_by_cursor(queryset, scope, time_field, cursor, limit, archive=None):
+    direction = NEXT
+    timestamp, row_id = None, None
+    if cursor is not None:
+        timestamp, row_id, direction = decode_cursor(scope, cursor)
+        if direction == NEXT:
+            queryset = queryset.filter(Q(**{time_field + '__lt': timestamp}) | Q(**{time_field: timestamp, 'id__lt': row_id}))
+        else:
+            queryset = queryset.filter(Q(**{time_field + '__gt': timestamp}) | Q(**{time_field: timestamp, 'id__gt': row_id}))
+
+    if direction == NEXT:
+        rows = list(queryset.order_by('-' + time_field, '-id')[:limit + 1])
+        if archive is not None and len(rows) <= limit:
+            rows += archive.older(timestamp, row_id, limit + 1 - len(rows))
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        rows = archive.newer(timestamp, row_id, limit) if archive is not None else []
+        if len(rows) < limit:
+            rows += list(queryset.order_by(time_field, 'id')[:limit - len(rows)])
+        rows.reverse()
+        # At least the row the cursor points at is older than this page.
+        has_older = True
+
+    next_cursor = None
+    prev_cursor = None
+    if len(rows) > 0:
+        if has_older:
+            next_cursor = encode_cursor(scope, row_value(rows[-1], time_field), row_value(rows[-1], 'id'), NEXT)
+        prev_cursor = encode_cursor(scope, row_value(rows[0], time_field), row_value(rows[0], 'id'), PREV)
+
+    return rows, next_cursor, prev_cursor
+
+"""
+Set cursor headers of the adjacent pages on given response.
+"""
+
+def set_cursor_headers(response, next_cursor, prev_cursor):
+    if next_cursor is not None:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    if prev_cursor is not None:
+        response[PREV_CURSOR_HEADER] = prev_cursor
+    return response
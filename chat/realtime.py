@@ -0,0 +1,204 @@
+import asyncio
+import json
+import uuid
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from chat.authentication import SignedTokenAuthentication
+from chat.broker import get_broker, publish_on_commit
+from chat.models import ChatRoomUser
+
+# Maximum number of seconds a long poll request waits for a new message.
+MAX_LONG_POLL_WAIT = 30
+
+"""
+Publish new message to all users of the chat room once the transaction commits.
+WARNING: Must be called within transaction context.
+"""
+
+def publish_message(chat_room, message):
+    user_ids = ChatRoomUser.objects.filter(chat_room=chat_room).values_list('user_id', flat=True)
+    publish_on_commit(user_ids, {
+        "type": "message",
+        "room_id": str(chat_room.id),
+        "message": {"sender_id": str(message.sender_id), "created_time": message.created_time.isoformat(), "text": message.text, "seq": message.seq},
+    })
+
+"""
+Publish membership states of the chat room to all its users once the transaction commits.
+Used when a room is created and when an invite is accepted or rejected.
+WARNING: Must be called within transaction context.
+"""
+
+def publish_room_state(chat_room):
+    chat_room_users = list(ChatRoomUser.objects.filter(chat_room=chat_room).values_list('user_id', 'state'))
+    publish_on_commit([user_id for user_id, _ in chat_room_users], {
+        "type": "room",
+        "room_id": str(chat_room.id),
+        "users": [{"user_id": str(user_id), "state": state} for user_id, state in chat_room_users],
+    })
+
+"""
+Publish the read marker of given chat room user to all users of the room once the transaction commits.
+WARNING: Must be called within transaction context.
+"""
+
+def publish_read(chat_room, chat_room_user):
+    user_ids = ChatRoomUser.objects.filter(chat_room=chat_room).values_list('user_id', flat=True)
+    publish_on_commit(user_ids, {
+        "type": "read",
+        "room_id": str(chat_room.id),
+        "user_id": str(chat_room_user.user_id),
+        "last_read_seq": chat_room_user.last_read_seq,
+    })
+
+"""
+Returns the user authenticated by the token in the query string (?token= or ?signed_token=) or Authorization
+header of given websocket scope, or None.
+"""
+
+@sync_to_async
+def authenticate_websocket(scope):
+    # Websockets are served outside of the request cycle of Django, so the connection of the thread is checked and
+    # released here as it is around requests.
+    close_old_connections()
+    try:
+        return authenticate_websocket_credentials(scope)
+    finally:
+        close_old_connections()
+
+"""
+Returns the user authenticated by the credentials of given websocket scope, or None.
+"""
+
+def authenticate_websocket_credentials(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    authentication, key = None, None
+    if 'token' in query:
+        authentication, key = TokenAuthentication(), query['token'][0]
+    elif 'signed_token' in query:
+        authentication, key = SignedTokenAuthentication(), query['signed_token'][0]
+    else:
+        headers = dict(scope.get('headers', []))
+        auth = headers.get(b'authorization', b'').decode().split()
+        if len(auth) == 2 and auth[0] == TokenAuthentication.keyword:
+            authentication, key = TokenAuthentication(), auth[1]
+        elif len(auth) == 2 and auth[0] == SignedTokenAuthentication.keyword:
+            authentication, key = SignedTokenAuthentication(), auth[1]
+    if key is None:
+        return None
+
+    try:
+        user, _ = authentication.authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    return user
+
+"""
+ASGI application pushing events of the authenticated user to a websocket.
+Events are JSON objects with a type of message, room or read.
+"""
+
+async def websocket_application(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    user = await authenticate_websocket(scope)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4001})
+        return
+    await send({'type': 'websocket.accept'})
+
+    subscription = get_broker().subscribe(user.id)
+    receive_task = asyncio.ensure_future(receive())
+    event_task = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receive_task, event_task}, return_when=asyncio.FIRST_COMPLETED)
+            if receive_task in done:
+                message = receive_task.result()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                # Messages from the client are ignored.
+                receive_task = asyncio.ensure_future(receive())
+            if event_task in done:
+                await send({'type': 'websocket.send', 'text': json.dumps(event_task.result())})
+                event_task = asyncio.ensure_future(subscription.get())
+    finally:
+        receive_task.cancel()
+        event_task.cancel()
+        subscription.close()
+
+"""
+Returns the user authenticated by the default authentication classes for given request, or None.
+"""
+
+@sync_to_async
+def authenticate_request(request):
+    drf_request = Request(request, authenticators=[authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    return user if user.is_authenticated else None
+
+def close_connection():
+    connection.close()
+
+"""
+Wraps given view listing messages of the room_id in the query so that requests with a wait parameter (in seconds)
+park until a message is posted in the room or the wait expires, instead of returning an empty list immediately.
+A parked request holds neither a worker thread nor a database connection when served over ASGI, and is woken up
+by the broker when a message is committed.
+"""
+
+def long_poll_view(view):
+    sync_view = sync_to_async(view)
+
+    async def long_poll(request):
+        wait = request.GET.get('wait')
+        room_id = request.GET.get('room_id')
+        user = None
+        try:
+            wait = min(float(wait), MAX_LONG_POLL_WAIT)
+            room_id = str(uuid.UUID(room_id))
+            user = await authenticate_request(request)
+        except (TypeError, ValueError):
+            pass
+        if user is None or not wait > 0:
+            # Not a valid long poll, let the view handle the request.
+            return await sync_view(request)
+
+        # Subscribe before querying so that no message committed in between is missed.
+        subscription = get_broker().subscribe(user.id)
+        try:
+            response = await sync_view(request)
+            if response.status_code != 200 or len(response.data) > 0:
+                return response
+
+            # Release the database connection of the request thread while parked.
+            await sync_to_async(close_connection)()
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + wait
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return response
+                try:
+                    event = await asyncio.wait_for(subscription.get(), remaining)
+                except asyncio.TimeoutError:
+                    return response
+                if event["type"] == "message" and event["room_id"] == room_id:
+                    return await sync_view(request)
+        finally:
+            subscription.close()
+
+    return long_poll
@@ -0,0 +1,48 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+"""
+JSON renderer encoding with orjson when it is installed, producing the same bytes as DRF's JSONRenderer
+(compact, UTF-8, U+2028 and U+2029 escaped). Types orjson does not encode like DRF, such as datetimes, go
+through DRF's encoder, and responses orjson cannot encode at all fall back to JSONRenderer.
+"""
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by JSONRenderer since they are not valid in JavaScript strings.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+"""
+MessagePack renderer for clients sending Accept: application/msgpack. Values are the same as in JSON responses,
+with datetimes and UUIDs encoded as strings by DRF's encoder. Requires the msgpack package.
+"""
+
+class MessagePackRenderer(BaseRenderer):
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True, datetime=False)
@@ -0,0 +1,112 @@
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+
+# Database alias reads of the current request are routed to, set by read_replica.
+read_database = ContextVar('read_database', default=None)
+
+"""
+Routes reads made within read_replica to the replica it picked, and everything else to the primary.
+Replicas are configured with the DATABASE_REPLICAS setting.
+"""
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return read_database.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication.
+        return db == DEFAULT_DB_ALIAS
+
+def pin_key(user_id):
+    return 'chat.replica_pin.' + str(user_id)
+
+"""
+Pin reads of given user to the primary for REPLICA_PIN_SECONDS so that they see their own writes while replicas
+catch up.
+"""
+
+def pin_to_primary(user_id):
+    cache.set(pin_key(user_id), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+"""
+Returns the alias of the database reads of given user should be served from.
+"""
+
+def choose_read_database(user):
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    if len(replicas) == 0 or cache.get(pin_key(user.id)):
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+"""
+Route reads of given user within the block to a replica unless they recently wrote. Yields the alias picked,
+which transactions opened within the block must use.
+"""
+
+@contextmanager
+def read_replica(user):
+    token = read_database.set(choose_read_database(user))
+    try:
+        yield read_database.get()
+    finally:
+        read_database.reset(token)
+
+"""
+Middleware pinning users to the primary after any request which may have written on their behalf. Supports both
+sync and async requests, so that async views such as long polls are not moved to a thread for their whole duration.
+"""
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def process_response(self, request, response):
+        # Set by DRF once the view authenticated the request.
+        user = getattr(request, 'user', None)
+        if request.method not in self.SAFE_METHODS and user is not None and user.is_authenticated:
+            pin_to_primary(user.id)
+        return response
+
+"""
+Number of queries executed per database alias in this process.
+"""
+
+class QueryCounts:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.counts[context['connection'].alias] += 1
+        return execute(sql, params, many, context)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+query_counts = QueryCounts()
+
+def count_queries(sender, connection, **kwargs):
+    if query_counts not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_counts)
+
+connection_created.connect(count_queries)
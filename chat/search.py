@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import time
+import uuid
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.conf import settings
+from django.core import signing
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Collate, Upper
+
+from chat.models import POST_SEARCH_CONFIG, Post, User
+from chat.pagination import InvalidCursorError
+from chat.serializers import POST_VALUES
+
+# Maximum number of matching posts ranked by a search, most recent first.
+MAX_SEARCH_CANDIDATES = 1000
+
+"""
+Returns an opaque signed cursor pointing after given search result. The cursor is tied to the query it was
+issued for.
+"""
+
+def encode_search_cursor(query_text, row):
+    return signing.dumps([query_text, row['rank'], row['created_time'].isoformat(), str(row['id'])], salt='chat.cursor.post-search', compress=True)
+
+"""
+Returns (rank, created_time, id) position of given cursor issued for given query.
+"""
+
+def decode_search_cursor(query_text, cursor):
+    try:
+        cursor_query_text, rank, created_time, row_id = signing.loads(cursor, salt='chat.cursor.post-search')
+        if cursor_query_text != query_text:
+            raise ValueError("Cursor was issued for another query")
+        return float(rank), datetime.fromisoformat(created_time), uuid.UUID(row_id)
+    except (signing.BadSignature, TypeError, ValueError) as e:
+        raise InvalidCursorError(str(e))
+
+"""
+Returns a page of posts matching given web search style query (quoted phrases, or, -excluded words), with the
+best matches first, along with the cursor of the next page or None. Matches come from the GIN index on the search
+document, or from the created_time index for common words, and only the MAX_SEARCH_CANDIDATES most recent matches
+are ranked. Posts with the same rank are ordered by most recent first.
+WARNING: Must be called within transaction context.
+"""
+
+def search_posts(query_text, cursor, limit):
+    query = SearchQuery(query_text, search_type='websearch', config=POST_SEARCH_CONFIG)
+    # Rank only the most recent matches so that common words do not rank a large part of the table.
+    candidates = Post.objects.filter(search_vector=query).order_by('-created_time', '-id').values('id')[:MAX_SEARCH_CANDIDATES]
+    # Ranks are real numbers. Read them as double precision so that they round trip exactly through cursors.
+    posts = Post.objects.filter(id__in=candidates).annotate(rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+    if cursor is not None:
+        rank, created_time, row_id = decode_search_cursor(query_text, cursor)
+        posts = posts.filter(Q(rank__lt=rank) | Q(rank=rank, created_time__lt=created_time) | Q(rank=rank, created_time=created_time, id__lt=row_id))
+
+    rows = list(posts.order_by('-rank', '-created_time', '-id').values(*POST_VALUES, 'rank')[:limit + 1])
+    next_cursor = encode_search_cursor(query_text, rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+"""
+Per process least recently used cache of username search results, expiring after a timeout. Usernames are only
+set once so hot prefixes can be served from memory for a few seconds.
+"""
+
+class PrefixCache:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expiry, value = entry
+            if time.monotonic() >= expiry:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = getattr(settings, 'USERNAME_SEARCH_CACHE_SIZE', 0)
+        if size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + getattr(settings, 'USERNAME_SEARCH_CACHE_TIMEOUT', 30), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+username_cache = PrefixCache()
+
+"""
+Returns up to limit (user_id, username) of active users whose username starts with given prefix, ignoring case,
+in username order and excluding given user. Served by an ordered scan of the username prefix index which stops
+after limit rows, so the time taken does not depend on the number of users.
+"""
+
+def search_usernames(prefix, limit, exclude_user_id):
+    key = (prefix.upper(), limit)
+    users = username_cache.get(key)
+    if users is None:
+        # One extra row in case the requesting user is among the results.
+        users = list(User.objects.annotate(upper_username=Collate(Upper('username'), 'C')).filter(upper_username__startswith=prefix.upper(), is_active=True).exclude(username='').order_by('upper_username').values_list('id', 'username')[:limit + 1])
+        username_cache.put(key, users)
+    return [(user_id, username) for user_id, username in users if user_id != exclude_user_id][:limit]
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from chat.models import User, Post, Message, Feedback
 from django.contrib.auth import authenticate
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 """
 Serialize user information provided during sign up (register). What is key is that password
@@ -103,6 +104,16 @@ class PostSerializer(serializers.ModelSerializer):
         model = Post
         fields = ['id', 'creator_user', 'created_time', 'title', 'description']
 
+"""
+Fast path of PostSerializer for pages of the feed, with the username of the creator of each post. Reads values()
+rows with the fields of POST_VALUES instead of model instances and returns the same representation.
+"""
+
+POST_VALUES = ('id', 'creator_user_id', 'created_time', 'title', 'description', 'creator_user__username')
+
+def serialize_posts(rows):
+    return [{"id": str(row['id']), "creator_user": row['creator_user_id'], "created_time": format_datetime(row['created_time']), "title": row['title'], "description": row['description'], "username": row['creator_user__username']} for row in rows]
+
 
 """
 Validate and serialize ChatRoom.
@@ -123,6 +134,47 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = ['sender_id', 'created_time', 'text']
 
+"""
+Returns given datetime formatted like DRF's DateTimeField: ISO 8601 in the current time zone, with Z for UTC.
+"""
+
+def format_datetime(value):
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+"""
+Fast path of MessageSerializer for pages of messages. Reads values() rows instead of model instances and returns
+the same representation. Fields of MESSAGE_VALUES must be selected, id and created_time allowing pagination.
+Given the read watermarks of the members of the room (see get_read_watermarks), each message also gets its
+sequence number and the ids of the members other than the sender who have read it.
+"""
+
+MESSAGE_VALUES = ('id', 'sender_id', 'created_time', 'text', 'seq')
+
+def serialize_messages(rows, read_watermarks=None):
+    messages = [{"sender_id": str(row['sender_id']), "created_time": format_datetime(row['created_time']), "text": row['text']} for row in rows]
+    if read_watermarks is not None:
+        for message, row in zip(messages, rows):
+            message["seq"] = row['seq']
+            message["read_by"] = [str(user_id) for user_id, last_read_seq in read_watermarks if last_read_seq >= row['seq'] and user_id != row['sender_id']]
+    return messages
+
+"""
+Serialize Message returned by sync. Includes the message id so that clients can deduplicate
+messages returned by overlapping syncs.
+"""
+
+class SyncMessageSerializer(serializers.ModelSerializer):
+    room_id = serializers.UUIDField(source='chat_room_id')
+
+    class Meta:
+        model = Message
+        fields = ['id', 'room_id', 'sender_id', 'created_time', 'text', 'seq']
+
 """
 Manage Chat Accept or Reject.
 """
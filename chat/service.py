@@ -3,17 +3,17 @@ from email import message
 from http import server
 from venv import create
 from chat import serializers
-from chat.serializers import FeedbackSerializer, PostSerializer, UserSerializer
+from chat.serializers import FeedbackSerializer, UserSerializer
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.db import transaction, IntegrityError
+from django.db.models import Count, Max
 from django.db.models.functions import Now
 from chat.serializers import (
     UserSerializer, 
     CreatePostSerializer, 
-    PostSerializer, 
     CreateChatRoomSerializer, 
     MessageSerializer, 
     ChatAcceptOrRejectSerializer, 
@@ -23,12 +23,32 @@ from chat.serializers import (
     PostIdSerializer,
     UsernameSerializer,
     ChatRoomMessagePostSerializer,
-    OTPSerializer
+    OTPSerializer,
+    SyncMessageSerializer,
+    MESSAGE_VALUES,
+    POST_VALUES,
+    serialize_messages,
+    serialize_posts
 )
-from chat.models import ChatRoomUser, Post, ChatRoom, User, Message, UserMessageMetadata, Feedback
-from chat.common import ChatRoomUserState, create_chat_room_reponse, create_error_message_resp, create_success_resp
+from chat.models import ArchivedMessageSegment, ChatRoomUser, Post, ChatRoom, User, Message, Feedback, InboxEntry
+from chat.common import ChatRoomUserState, add_message_to_chat_room, get_latest_messages_by_room, get_read_watermarks, create_chat_room_reponse, create_error_message_resp, create_success_resp
+from chat.inbox import INBOX_RESPONSE_FIELDS, create_inbox_entries, create_inbox_responses, mark_inbox_read, update_inbox_for_message, update_inbox_visibility
+from chat.archive import ArchivedMessages
+from chat.authentication import issue_signed_token
+from chat.deletion import request_account_deletion
 from chat.email_auth_backend import verify_email
-from datetime import datetime
+from chat.conditional import Validators
+from chat.feed import get_feed_page, get_feed_state, invalidate_feed
+from chat.pagination import NEXT, InvalidCursorError, decode_sync_token, encode_cursor, encode_sync_token, paginate_by_cursor, set_cursor_headers
+from chat.realtime import publish_message, publish_read, publish_room_state
+from chat.routers import query_counts, read_replica
+from chat.search import search_posts, search_usernames
+from chat.transactions import READ_COMMITTED, READ_ONLY_DEFERRABLE, WRITE_READ_COMMITTED, conflict_metrics, isolated_atomic, read_only_atomic, retry_on_conflict
+from chat.usernames import is_username_available, record_username
+from datetime import datetime, timedelta
+import uuid
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
@@ -58,6 +78,7 @@ class SignUp(APIView):
 
         return Response({
             'token': token.key,
+            'signed_token': issue_signed_token(user),
             'user_id': user.pk,
             'email': user.email,
             'username': user.username,
@@ -71,6 +92,7 @@ class ActivateAccount(APIView):
 
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict('activate')
     def post(self, request):
         serializer = OTPSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -109,6 +131,7 @@ class Login(ObtainAuthToken):
         token = Token.objects.get(user=user)
         return Response({
             'token': token.key,
+            'signed_token': issue_signed_token(user),
             'user_id': user.pk,
             'email': user.email,
             'username': user.username,
@@ -122,6 +145,7 @@ class UserNameManager(APIView):
     
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict('username')
     def post(self, request):
         serializer = UsernameSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -134,11 +158,17 @@ class UserNameManager(APIView):
                     return Response(data=create_error_message_resp("Username already set for user!"), status=status.HTTP_400_BAD_REQUEST)
 
                 username = serializer.get_user_name()
-                if len(User.objects.filter(username__exact=username)) > 0:
+                user.username = username
+                try:
+                    # Uniqueness of set usernames is enforced by the database, so concurrent claims cannot both win.
+                    with transaction.atomic():
+                        user.save()
+                except IntegrityError:
                     return Response(data=create_error_message_resp("Username already taken"), status=status.HTTP_400_BAD_REQUEST)
 
-                user.username = username
-                user.save()          
+                record_username(username)
+                # Usernames are part of the cached posts feed.
+                invalidate_feed()
         except User.DoesNotExist:
             return Response(data=create_error_message_resp("Post does not exist"), status=status.HTTP_400_BAD_REQUEST)
 
@@ -149,10 +179,34 @@ class UserNameManager(APIView):
     """
 
     def get(self, request):
-        user = request.user
-        resp = {"username": user.username}
+        # Signed token authentication does not load the user, so read the username from the database.
+        username = User.objects.filter(pk=request.user.id).values_list('username', flat=True).first()
+        resp = {"username": username}
         return Response(data=resp, status=status.HTTP_200_OK)
 
+"""
+Check if a username can be claimed.
+"""
+
+class UsernameAvailabilityManager(APIView):
+
+    permission_classes = [IsAuthenticated]
+
+    """
+    Returns whether the username parameter is available. Cheap enough to be called as the user types: most
+    available usernames are answered from memory. A username reported available may still be claimed by someone
+    else before the user does, in which case setting it fails.
+    """
+
+    def get(self, request):
+        serializer = UsernameSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        username = serializer.get_user_name()
+
+        with read_replica(request.user):
+            available = is_username_available(username)
+        return Response(data={"username": username, "available": available}, status=status.HTTP_200_OK)
+
 """
 Create a user.
 """
@@ -186,40 +240,54 @@ class PostManager(APIView):
         return Response(data=created_post_serializer.data, status=status.HTTP_201_CREATED)
 
     """
-    Returns a list of Posts paginated by created_time.
+    Returns a list of Posts paginated by created_time. Pages are requested with the opaque cursor returned
+    in the cursor headers of the previous page; the created_time parameter is still honored for older clients.
     """
 
     def get(self, request):
         # We will return 50 posts at a time.
         limit = 50
         created_time = request.query_params.get('created_time')
+        cursor = request.query_params.get('cursor')
+
+        # Every change to posts or usernames changes the feed state, so it validates every page of the feed.
+        with read_only_atomic():
+            validators = Validators(request, get_feed_state())
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return not_modified
 
-        final_posts = []
         try:
-            with transaction.atomic():
-                posts = []
-                if created_time is None:
-                    # Return most recent results.
-                    posts = Post.objects.order_by('-created_time')[:limit]
-                else:
-                    posts = Post.objects.filter(created_time__lt=created_time).order_by('-created_time')[:limit]
-
-                # Fetch usernames of each person who created a post.
-                usernames = [post.creator_user.username for post in posts]
-                serializer = PostSerializer(posts, many=True)
-                for i, py_post in enumerate(serializer.data):
-                    py_post_copy = py_post.copy()
-                    py_post_copy['username'] = usernames[i]
-                    final_posts.append(py_post_copy)
+            page = None
+            if created_time is None:
+                # The first pages are the same for every user and served from the cache. They are built on the
+                # primary so that a lagging replica is never cached.
+                page = get_feed_page(cursor, lambda: self.list_posts(None, cursor, limit))
+            if page is None:
+                with read_replica(request.user) as using:
+                    page = self.list_posts(created_time, cursor, limit, using)
+            final_posts, next_cursor, prev_cursor = page
+        except InvalidCursorError:
+            return Response(data="Invalid cursor", status=status.HTTP_400_BAD_REQUEST)
+        return validators.set_headers(set_cursor_headers(Response(data=final_posts, status=status.HTTP_200_OK), next_cursor, prev_cursor))
 
-        except User.DoesNotExist:
-            return Response(data="User not found", status=status.HTTP_400_BAD_REQUEST)
-        return Response(data=final_posts, status=status.HTTP_200_OK)
+    """
+    Returns (posts, next_cursor, prev_cursor) of the page at given cursor, with the username of the creator of each post.
+    """
+
+    def list_posts(self, created_time, cursor, limit, using=None):
+        with read_only_atomic(using=using):
+            posts = Post.objects.values(*POST_VALUES)
+            if created_time is not None:
+                posts = posts.filter(created_time__lt=created_time)
+            posts, next_cursor, prev_cursor = paginate_by_cursor(posts, 'posts', 'created_time', cursor, limit)
+        return serialize_posts(posts), next_cursor, prev_cursor
 
     """
     Delete a post previosuly created by the user.
     """
 
+    @retry_on_conflict('post-delete')
     def delete(self, request):
         serializer = PostIdSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -236,6 +304,62 @@ class PostManager(APIView):
         return Response(data=create_success_resp(), status=status.HTTP_200_OK)
 
 
+"""
+Full text search over posts.
+"""
+
+class PostSearchManager(APIView):
+
+    permission_classes = [IsAuthenticated]
+
+    """
+    Returns posts matching the q parameter, best matches first, 50 at a time. The next page is requested with
+    the cursor returned in the next cursor header.
+    """
+
+    def get(self, request):
+        limit = 50
+        query_text = request.query_params.get('q', '').strip()
+        if query_text == '':
+            return Response(data=create_error_message_resp("Missing search query"), status=status.HTTP_400_BAD_REQUEST)
+        cursor = request.query_params.get('cursor')
+
+        try:
+            with read_replica(request.user) as using, read_only_atomic(using=using):
+                posts, next_cursor = search_posts(query_text, cursor, limit)
+        except InvalidCursorError:
+            return Response(data="Invalid cursor", status=status.HTTP_400_BAD_REQUEST)
+        return set_cursor_headers(Response(data=serialize_posts(posts), status=status.HTTP_200_OK), next_cursor, None)
+
+"""
+Find users to chat with by username.
+"""
+
+class UserSearchManager(APIView):
+
+    permission_classes = [IsAuthenticated]
+
+    """
+    Returns users whose username starts with the prefix parameter, ignoring case, in username order.
+    At most limit (default 10, up to 20) users are returned.
+    """
+
+    def get(self, request):
+        max_limit = 20
+        prefix = request.query_params.get('prefix', '').strip()
+        if prefix == '':
+            return Response(data=create_error_message_resp("Missing prefix"), status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), max_limit)
+        except ValueError:
+            return Response(data=create_error_message_resp("Invalid limit"), status=status.HTTP_400_BAD_REQUEST)
+        if limit <= 0:
+            return Response(data=create_error_message_resp("Invalid limit"), status=status.HTTP_400_BAD_REQUEST)
+
+        with read_replica(request.user) as using, read_only_atomic(using=using):
+            users = search_usernames(prefix, limit, request.user.id)
+        return Response(data=[{"user_id": str(user_id), "username": username} for user_id, username in users], status=status.HTTP_200_OK)
+
 """
 Manage chat rooms per user.
 """
@@ -248,6 +372,7 @@ class ChatRoomsPerUserManager(APIView):
     Create a chat room and invite user with initial message.
     """
 
+    @retry_on_conflict('chat-create')
     def post(self, request):
         chat_room_serializer = CreateChatRoomSerializer(data=request.data)
         chat_room_serializer.is_valid(raise_exception = True)
@@ -268,18 +393,17 @@ class ChatRoomsPerUserManager(APIView):
                 chat_room.save()
 
                 # Create chat room users.
-                room_creator_user = ChatRoomUser(user_id=creator_id, chat_room=chat_room, joined_time= Now(), state=ChatRoomUserState.JOINED.name)
+                # The creator has read the initial message which is the first message of the room.
+                room_creator_user = ChatRoomUser(user_id=creator_id, chat_room=chat_room, joined_time= Now(), state=ChatRoomUserState.JOINED.name, last_read_time=Now(), last_read_seq=1)
                 room_invitee_user = ChatRoomUser(user_id=invitee_id, chat_room=chat_room, invited_time= Now(), state=ChatRoomUserState.INVITED.name)
                 room_creator_user.save()
                 room_invitee_user.save()
 
                 # Create message.
                 initial_message = Message(chat_room=chat_room, text=initial_message, sender_id=creator_id)
-                initial_message.save()
-
-                # Mark message as read for sender.
-                user_message_metadata = UserMessageMetadata(user_id=creator_id,message=initial_message)
-                user_message_metadata.save()
+                add_message_to_chat_room(chat_room, initial_message)
+                create_inbox_entries(chat_room, [room_creator_user, room_invitee_user])
+                publish_room_state(chat_room)
 
         except User.DoesNotExist:
             return Response(data=create_error_message_resp("User not found"), status=status.HTTP_400_BAD_REQUEST)
@@ -292,44 +416,36 @@ class ChatRoomsPerUserManager(APIView):
     """
     List Chats for given user. Only chat rooms where they are invited/joined and other user is not is returned.
     Results are paginated by most recent rooms and sorted by most recently updated room.
+    Rooms are read from the inbox of the user which only contains visible rooms.
+    Pages are requested with the opaque cursor returned in the cursor headers of the previous page.
     """
     
     def get(self, request):
         limit = 50
         last_updated_time = request.query_params.get('last_updated_time')
+        cursor = request.query_params.get('cursor')
         user_id = request.user.id
 
         try:
-            with transaction.atomic():
-                User.objects.get(pk=user_id)
-
-                # Fetch all chat rooms that the user is part of and has not rejected.
-                all_chat_rooms = []
-                if last_updated_time is None:
-                    # Fetch most recent rooms.
-                    all_chat_rooms = ChatRoom.objects.filter(chatroomuser__user_id__exact=user_id).exclude(chatroomuser__state__exact=ChatRoomUserState.REJECTED.name).order_by('-last_updated_time')[:limit]
-                else:
-                    all_chat_rooms = ChatRoom.objects.filter(chatroomuser__user_id__exact=user_id).exclude(chatroomuser__state__exact=ChatRoomUserState.REJECTED.name).filter(last_updated_time__lt=last_updated_time).order_by('-last_updated_time')[:limit]
-                
-                room_ids = [r.id for r in all_chat_rooms]
-                
-                # Exclude rooms where the other user is in invited/rejected state. We don't want to show these in the UI.
-                chat_room_users = ChatRoomUser.objects.filter(chat_room__id__in=room_ids).exclude(user_id__exact=user_id).exclude(state__in=[ChatRoomUserState.INVITED.name, ChatRoomUserState.REJECTED.name])
-                final_room_ids = [r.chat_room.id for r in chat_room_users]
-                final_room_ids_set = set(final_room_ids)
+            with read_replica(request.user) as using, read_only_atomic(using=using):
+                # Every change to the inbox of the user touches the last_updated_time of one of its entries.
+                inbox_state = InboxEntry.objects.filter(user_id__exact=user_id).aggregate(last_updated_time=Max('last_updated_time'), count=Count('id'))
+                validators = Validators(request, inbox_state, inbox_state['last_updated_time'])
+                not_modified = validators.not_modified(request)
+                if not_modified is not None:
+                    return not_modified
 
-                # Query the chat room users.
-                final_chat_rooms = list(filter(lambda x: x.id in final_room_ids_set, all_chat_rooms))
-                
-                results = []
-                for chat_room in final_chat_rooms:
-                    result_room = create_chat_room_reponse(user_id, chat_room)
-                    results.append(result_room)
+                inbox_entries = InboxEntry.objects.filter(user_id__exact=user_id).filter(visible=True).values(*INBOX_RESPONSE_FIELDS)
+                if last_updated_time is not None:
+                    inbox_entries = inbox_entries.filter(sort_time__lt=last_updated_time)
+                inbox_entries, next_cursor, prev_cursor = paginate_by_cursor(inbox_entries, 'chats', 'sort_time', cursor, limit)
 
-        except User.DoesNotExist:
-            return Response(data="User not found", status=status.HTTP_400_BAD_REQUEST)
+                results = create_inbox_responses(inbox_entries)
 
-        return Response(data=results, status=status.HTTP_200_OK)
+        except InvalidCursorError:
+            return Response(data="Invalid cursor", status=status.HTTP_400_BAD_REQUEST)
+
+        return validators.set_headers(set_cursor_headers(Response(data=results, status=status.HTTP_200_OK), next_cursor, prev_cursor))
 
 """
 Single chat room manager.
@@ -351,14 +467,23 @@ class ChatRoomManager(APIView):
         user_id = request.user.id
 
         try:
-            with transaction.atomic():
-                User.objects.get(pk=user_id)
+            with read_replica(request.user) as using, read_only_atomic(using=using):
+                # Messages, reads and membership changes in the room touch the inbox entry of every member.
+                validators = None
+                entry_updated_time = InboxEntry.objects.filter(user_id__exact=user_id, chat_room_id__exact=room_id).values_list('last_updated_time', flat=True).first()
+                if entry_updated_time is not None:
+                    validators = Validators(request, entry_updated_time, entry_updated_time)
+                    not_modified = validators.not_modified(request)
+                    if not_modified is not None:
+                        return not_modified
+
                 chat_room = ChatRoom.objects.get(pk=room_id)
                 resp = create_chat_room_reponse(user_id, chat_room)
         except ChatRoom.DoesNotExist:
             return Response(data="Chat Room does not exist", status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(data=resp, status=status.HTTP_200_OK)
+        response = Response(data=resp, status=status.HTTP_200_OK)
+        return response if validators is None else validators.set_headers(response)
 
 """
 Checks if chat room already exists between given users.
@@ -382,13 +507,12 @@ class AlreadyExistingChatRoom(APIView):
         chat_room_exists_result = {"exists": False, "room_id": "", "pending_invite_to_other_user": False, "pending_invite_to_me": False}
         
         try:
-            with transaction.atomic():
-                User.objects.get(pk=user_id)
+            with read_replica(request.user) as using, read_only_atomic(using=using):
                 User.objects.get(pk=other_id)
 
                 # Check if there are any rooms where this user is joined but other user is invited.
-                user_room_id_joined_list = [cru.chat_room.id for cru in ChatRoomUser.objects.filter(user_id__exact=user_id).filter(state__exact=ChatRoomUserState.JOINED.name)]
-                other_room_id_invited_list = [cru.chat_room.id for cru in ChatRoomUser.objects.filter(user_id__exact=other_id).filter(state__exact=ChatRoomUserState.INVITED.name)]
+                user_room_id_joined_list = ChatRoomUser.objects.filter(user_id__exact=user_id).filter(state__exact=ChatRoomUserState.JOINED.name).values_list('chat_room_id', flat=True)
+                other_room_id_invited_list = ChatRoomUser.objects.filter(user_id__exact=other_id).filter(state__exact=ChatRoomUserState.INVITED.name).values_list('chat_room_id', flat=True)
 
                 # Check if there are any pending invites user has sent to other user.
                 invite_int_set = set(user_room_id_joined_list) & set(other_room_id_invited_list)
@@ -401,8 +525,8 @@ class AlreadyExistingChatRoom(APIView):
                     return Response(data=chat_room_exists_result, status=status.HTTP_200_OK)
 
                 # Check if there are any pending invites other user has sent to me.
-                user_room_id_invited_list = [cru.chat_room.id for cru in ChatRoomUser.objects.filter(user_id__exact=user_id).filter(state__exact=ChatRoomUserState.INVITED.name)]
-                other_room_id_joined_list = [cru.chat_room.id for cru in ChatRoomUser.objects.filter(user_id__exact=other_id).filter(state__exact=ChatRoomUserState.JOINED.name)]
+                user_room_id_invited_list = ChatRoomUser.objects.filter(user_id__exact=user_id).filter(state__exact=ChatRoomUserState.INVITED.name).values_list('chat_room_id', flat=True)
+                other_room_id_joined_list = ChatRoomUser.objects.filter(user_id__exact=other_id).filter(state__exact=ChatRoomUserState.JOINED.name).values_list('chat_room_id', flat=True)
                 invite_int_set = set(user_room_id_invited_list) & set(other_room_id_joined_list)
                 pending_invite_to_me = len(invite_int_set) > 0
                 if pending_invite_to_me:
@@ -435,7 +559,8 @@ class MessagesManager(APIView):
     permission_classes = [IsAuthenticated]
 
     """
-    List Messages in Chat paginated by creation time.
+    List Messages in Chat paginated by creation time. Pages are requested with the opaque cursor returned
+    in the cursor headers of the previous page; the created_time parameter is still honored for older clients.
     """
 
     def get(self, request):
@@ -444,35 +569,56 @@ class MessagesManager(APIView):
         if room_id is None:
             return Response("Missing Chat Room Id in request", status=status.HTTP_400_BAD_REQUEST)
         created_time = request.query_params.get('created_time')
+        cursor = request.query_params.get('cursor')
         user_id = request.user.id
         
         try:
-            with transaction.atomic():
-                ChatRoom.objects.get(pk=room_id)
-                ChatRoomUser.objects.filter(user_id__exact=user_id).get(chat_room__id__exact=room_id)
-                if created_time is None:
-                    messages = Message.objects.filter(chat_room__id__exact=room_id).order_by('-created_time')[:limit]
-                else:
-                    messages = Message.objects.filter(chat_room__id__exact=room_id).filter(created_time__lt=created_time).order_by('-created_time')[:limit]
-                
-                message_serializer = MessageSerializer(messages, many=True)
+            with read_replica(request.user) as using, read_only_atomic(using=using):
+                # Messages and reads in the room touch the inbox entry of every member, so the entry of the user
+                # validates both the messages and their read receipts.
+                entry = InboxEntry.objects.filter(user_id__exact=user_id, chat_room_id__exact=room_id).values_list('chat_room_id', 'last_updated_time').first()
+                if entry is None:
+                    # Not a member, or no such room.
+                    ChatRoom.objects.get(pk=room_id)
+                    raise ChatRoomUser.DoesNotExist()
+                chat_room_id, entry_updated_time = entry
+                validators = Validators(request, entry_updated_time, entry_updated_time)
+                not_modified = validators.not_modified(request)
+                if not_modified is not None:
+                    return not_modified
+
+                messages = Message.objects.filter(chat_room__id__exact=chat_room_id).values(*MESSAGE_VALUES)
+                if created_time is not None:
+                    messages = messages.filter(created_time__lt=created_time)
+                    created_time = parse_datetime(created_time)
+                    if created_time is not None and timezone.is_naive(created_time):
+                        created_time = timezone.make_aware(created_time)
+                # Pages older than the message table are read from the archive.
+                archived_messages = ArchivedMessages(chat_room_id, before=created_time)
+                # Cursors are scoped to the room so they cannot be replayed against another room.
+                messages, next_cursor, prev_cursor = paginate_by_cursor(messages, 'messages.' + str(chat_room_id), 'created_time', cursor, limit, archived_messages)
+                read_watermarks = get_read_watermarks([chat_room_id])[chat_room_id]
         except ChatRoom.DoesNotExist:
             return Response(data="Chat Room does not exist", status=status.HTTP_400_BAD_REQUEST)
         except ChatRoomUser.DoesNotExist:
             return Response(data="User does not belong to given chat room", status=status.HTTP_400_BAD_REQUEST)
+        except InvalidCursorError:
+            return Response(data="Invalid cursor", status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(data=message_serializer.data, status=status.HTTP_200_OK)
+        return validators.set_headers(set_cursor_headers(Response(data=serialize_messages(messages, read_watermarks), status=status.HTTP_200_OK), next_cursor, prev_cursor))
 
     """
     Post chat message to given chat room.
     """
 
+    @retry_on_conflict('message-post')
     def post(self, request):
         serializer = ChatRoomMessagePostSerializer(data=request.data)
         serializer.is_valid(raise_exception = True)
         user_id = request.user.id
         try:
-            with transaction.atomic():
+            # Senders of a busy room queue on the row of the room instead of failing serialization and retrying.
+            with isolated_atomic(WRITE_READ_COMMITTED):
                 room_id = serializer.get_room_id()
                 message = serializer.get_message()
                 chat_room = ChatRoom.objects.get(pk=room_id)
@@ -480,11 +626,9 @@ class MessagesManager(APIView):
 
                 # Create message.
                 message = Message(chat_room=chat_room, text=message, sender_id=user_id)
-                message.save()
-
-                # Update chat room.
-                chat_room.last_updated_time = Now()
-                chat_room.save()
+                add_message_to_chat_room(chat_room, message)
+                update_inbox_for_message(chat_room, message)
+                publish_message(chat_room, message)
 
                 message_serializer = MessageSerializer(message)
 
@@ -495,6 +639,57 @@ class MessagesManager(APIView):
 
         return Response(data=message_serializer.data, status=status.HTTP_200_OK)
 
+"""
+Newest messages of several chat rooms at once.
+"""
+
+class LatestMessagesManager(APIView):
+
+    permission_classes = [IsAuthenticated]
+
+    """
+    Returns the newest messages (limit per room, default 20, up to 50) of each room of the comma separated room_ids
+    parameter (up to 50 rooms), in the order given. Each room comes with the cursor of its next (older) page, to be
+    requested from message/. Rooms whose latest messages were archived are served from the archive. The user must
+    belong to every room.
+    """
+
+    def get(self, request):
+        max_rooms = 50
+        max_limit = 50
+        try:
+            room_ids = list(dict.fromkeys(uuid.UUID(room_id) for room_id in request.query_params.get('room_ids', '').split(',') if room_id != ''))
+            limit = min(int(request.query_params.get('limit', 20)), max_limit)
+        except ValueError:
+            return Response(data=create_error_message_resp("Invalid room ids or limit"), status=status.HTTP_400_BAD_REQUEST)
+        if len(room_ids) == 0 or len(room_ids) > max_rooms or limit <= 0:
+            return Response(data=create_error_message_resp("Between 1 and " + str(max_rooms) + " room ids and a positive limit are required"), status=status.HTTP_400_BAD_REQUEST)
+
+        with read_replica(request.user) as using, read_only_atomic(using=using):
+            member_room_ids = set(ChatRoomUser.objects.filter(user_id__exact=request.user.id, chat_room_id__in=room_ids).values_list('chat_room_id', flat=True))
+            if len(member_room_ids) != len(room_ids):
+                return Response(data="User does not belong to given chat room", status=status.HTTP_400_BAD_REQUEST)
+            messages_by_room = get_latest_messages_by_room(room_ids, limit, using)
+            read_watermarks = get_read_watermarks(room_ids)
+
+            # Rooms with no more messages in the table continue into their archived messages, if any.
+            short_room_ids = [room_id for room_id in room_ids if len(messages_by_room[room_id]) <= limit]
+            archived_room_ids = set(ArchivedMessageSegment.objects.filter(chat_room_id__in=short_room_ids).values_list('chat_room_id', flat=True).distinct())
+            for room_id in archived_room_ids:
+                messages = messages_by_room[room_id]
+                timestamp, row_id = (messages[-1]['created_time'], messages[-1]['id']) if messages else (None, None)
+                messages += ArchivedMessages(room_id).older(timestamp, row_id, limit + 1 - len(messages))
+
+        results = []
+        for room_id in room_ids:
+            messages = messages_by_room[room_id]
+            next_cursor = None
+            if len(messages) > limit:
+                messages = messages[:limit]
+                next_cursor = encode_cursor('messages.' + str(room_id), messages[-1]['created_time'], messages[-1]['id'], NEXT)
+            results.append({"room_id": str(room_id), "messages": serialize_messages(messages, read_watermarks[room_id]), "next_cursor": next_cursor})
+        return Response(data=results, status=status.HTTP_200_OK)
+
 """
 Returns unread messages for given user.
 """
@@ -505,6 +700,7 @@ class UnreadMessagesManager(APIView):
 
     """
     Returns a list of unread messages for a user across all chat rooms.
+    Requests with a wait parameter are parked until a message arrives (see chat.realtime.long_poll_view).
     """
 
     def get(self, request):
@@ -517,20 +713,74 @@ class UnreadMessagesManager(APIView):
         user_id = request.user.id
         
         try:
-            with transaction.atomic():
+            # Polled frequently and needs no snapshot across its statements.
+            # Served by the primary: long polls are woken by commits a replica may not have applied yet.
+            with read_only_atomic(READ_COMMITTED):
                 ChatRoom.objects.get(pk=room_id)
                 ChatRoomUser.objects.filter(user_id__exact=user_id).get(chat_room__id__exact=room_id)
-                messages = Message.objects.filter(chat_room__id__exact=room_id).filter(created_time__gt=created_time).order_by('-created_time')
-                
-                message_serializer = MessageSerializer(messages, many=True)
+                messages = Message.objects.filter(chat_room__id__exact=room_id).filter(created_time__gt=created_time).order_by('-created_time').values(*MESSAGE_VALUES)
+                messages = serialize_messages(messages)
         except ChatRoom.DoesNotExist:
             return Response(data="Chat Room does not exist", status=status.HTTP_400_BAD_REQUEST)
         except ChatRoomUser.DoesNotExist:
             return Response(data="User does not belong to given chat room", status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(data=message_serializer.data, status=status.HTTP_200_OK)
+        return Response(data=messages, status=status.HTTP_200_OK)
         
 
+"""
+Returns everything that changed for the user since the sync token.
+"""
+
+class SyncManager(APIView):
+
+    permission_classes = [IsAuthenticated]
+
+    """
+    Returns rooms whose inbox entry changed since the timestamp of the token, new messages in these rooms,
+    the memberships and read markers of these rooms and a new token. Without a token every room of the user
+    is returned. Work is proportional to the number of changed rooms, not to the total number of rooms.
+    """
+
+    def get(self, request):
+        # Maximum number of messages returned. Clients page older messages with message/ when exceeded.
+        message_limit = 500
+        # Changes committed by transactions that started before the previous sync are caught by re-reading this window.
+        # Clients deduplicate messages by id.
+        overlap = timedelta(seconds=5)
+        token = request.query_params.get('token')
+        user_id = request.user.id
+
+        try:
+            since = None if token is None else decode_sync_token(token) - overlap
+            now = timezone.now()
+            # Full syncs are long reads, wait for a safe snapshot instead of taking predicate locks.
+            # Served by the primary so that the token never runs ahead of replication.
+            with read_only_atomic(READ_ONLY_DEFERRABLE):
+                inbox_entries = InboxEntry.objects.filter(user_id__exact=user_id).values(*INBOX_RESPONSE_FIELDS)
+                if since is not None:
+                    inbox_entries = inbox_entries.filter(last_updated_time__gt=since)
+                inbox_entries = list(inbox_entries)
+
+                rooms = create_inbox_responses(inbox_entries)
+                for room, entry in zip(rooms, inbox_entries):
+                    room["visible"] = entry['visible']
+
+                visible_room_ids = [entry['chat_room_id'] for entry in inbox_entries if entry['visible']]
+                messages = Message.objects.filter(chat_room__id__in=visible_room_ids)
+                if since is not None:
+                    messages = messages.filter(created_time__gt=since)
+                messages = list(messages.order_by('-created_time', '-id')[:message_limit + 1])
+                has_more_messages = len(messages) > message_limit
+                messages = SyncMessageSerializer(reversed(messages[:message_limit]), many=True).data
+
+                read_markers = ChatRoomUser.objects.filter(chat_room__id__in=[entry['chat_room_id'] for entry in inbox_entries]).values('chat_room_id', 'user_id', 'last_read_seq', 'last_read_time')
+                read_markers = [{"room_id": str(marker['chat_room_id']), "user_id": str(marker['user_id']), "last_read_seq": marker['last_read_seq'], "last_read_time": marker['last_read_time']} for marker in read_markers]
+        except InvalidCursorError:
+            return Response(data=create_error_message_resp("Invalid sync token"), status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(data={"token": encode_sync_token(now), "rooms": rooms, "messages": messages, "has_more_messages": has_more_messages, "read_markers": read_markers}, status=status.HTTP_200_OK)
+
 """
 Manage Chat Request Invite.
 """
@@ -543,6 +793,7 @@ class ManageChatInviteRequest(APIView):
     Accept or reject given chat request invite.
     """
 
+    @retry_on_conflict('chat-invite')
     def post(self, request):
         serializer = ChatAcceptOrRejectSerializer(data=request.data)
         serializer.is_valid(raise_exception = True)
@@ -553,8 +804,7 @@ class ManageChatInviteRequest(APIView):
 
         try:
             with transaction.atomic():
-                User.objects.get(pk=user_id)
-                ChatRoom.objects.get(pk=room_id)
+                chat_room = ChatRoom.objects.get(pk=room_id)
                 result_state = ChatRoomUserState.JOINED if accepted else ChatRoomUserState.REJECTED
 
                 chat_room_user  = ChatRoomUser.objects.filter(chat_room__id__exact=room_id).get(user_id__exact=user_id)
@@ -566,9 +816,9 @@ class ManageChatInviteRequest(APIView):
                     chat_room_user.joined_time = Now()
                 
                 chat_room_user.save()
+                update_inbox_visibility(chat_room)
+                publish_room_state(chat_room)
 
-        except User.DoesNotExist:
-            return Response(data=create_error_message_resp("User does not exist"), status=status.HTTP_400_BAD_REQUEST)
         except ChatRoom.DoesNotExist:
             return Response(data=create_error_message_resp("Chat Room does not exist"), status=status.HTTP_400_BAD_REQUEST)
 
@@ -582,6 +832,7 @@ class MarkChatAsRead(APIView):
 
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict('read')
     def post(self, request):
         serializer = ChatReadSerializer(data=request.data)
         serializer.is_valid(raise_exception = True)
@@ -591,16 +842,16 @@ class MarkChatAsRead(APIView):
 
         try:
             with transaction.atomic():
-                User.objects.get(pk=user_id)
-                ChatRoom.objects.get(pk=room_id)
+                chat_room = ChatRoom.objects.get(pk=room_id)
 
                 # Check that user is in joined state and save last read time as now if so.
                 chatroom_user = ChatRoomUser.objects.filter(user_id__exact=user_id).filter(chat_room__id__exact=room_id).get(state__exact=ChatRoomUserState.JOINED.name)
                 chatroom_user.last_read_time = Now()
+                chatroom_user.last_read_seq = chat_room.last_message_seq
                 chatroom_user.save()
+                mark_inbox_read(chat_room, user_id)
+                publish_read(chat_room, chatroom_user)
 
-        except User.DoesNotExist:
-            return Response(data=create_error_message_resp("User does not exist"), status=status.HTTP_400_BAD_REQUEST)
         except ChatRoom.DoesNotExist:
             return Response(data=create_error_message_resp("Chat Room does not exist"), status=status.HTTP_400_BAD_REQUEST)
         except ChatRoomUser.DoesNotExist:
@@ -616,6 +867,7 @@ class FeedbackManager(APIView):
 
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict('feedback')
     def post(self, request):
         user_id = request.user.id
         serializer = FeedbackSerializer(data=request.data)
@@ -632,29 +884,47 @@ class FeedbackManager(APIView):
         return Response(data="success", status=status.HTTP_200_OK)
 
 """
-Handle User account deletion.
+Handle User account deletion. The account is disabled at once and purged in the background.
 """
 
 class AccountDeletionManager(APIView):
 
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict('delete-account')
     def get(self, request):
         user_id = request.user.id
 
         try:
             with transaction.atomic():
                 user = User.objects.get(pk=user_id)
-                
-                # Find all chats rooms the user is a part of and delete them.
-                chat_room_ids = [cru.chat_room.id for cru in ChatRoomUser.objects.filter(user_id__exact=user_id)]
-                if len(chat_room_ids) > 0:
-                    print("deleting ", chat_room_ids, " chat rooms")
-                    ChatRoom.objects.filter(id__in=chat_room_ids).delete()
-
-                # Delete user.
-                user.delete()
+
+                # Disable the account right away. Its chat rooms, messages and posts are purged in the background
+                # by the purge_deleted_accounts command.
+                request_account_deletion(user)
         except User.DoesNotExist:
             return Response(data=create_error_message_resp("User does not exist"), status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(data=create_success_resp(), status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(data=create_success_resp(), status=status.HTTP_200_OK)
+
+"""
+Serialization conflict counters of write endpoints in this process.
+"""
+
+class ConflictMetricsManager(APIView):
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(data=conflict_metrics.snapshot(), status=status.HTTP_200_OK)
+
+"""
+Number of queries executed per database alias in this process.
+"""
+
+class DatabaseMetricsManager(APIView):
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(data=query_counts.snapshot(), status=status.HTTP_200_OK)
\ No newline at end of file
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from chat.archive import archive_message_partition, create_message_partition, month_start
+from chat.models import ChatRoomUser, Message, User
+
+"""
+Create a user with given email and username. Returns the user and an API client authenticated as them.
+"""
+
+def create_user(email, username):
+    user = User(email=email, username=username)
+    user.set_password('correct-horse-battery')
+    user.save()
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=user).key)
+    return user, client
+
+"""
+Create a chat room through the API in which inviter invites invitee, who accepts. Returns the id of the room.
+"""
+
+def create_room(inviter_client, invitee, invitee_client, initial_message='hi'):
+    response = inviter_client.post('/chats/', {'invitee_id': str(invitee.id), 'initial_message': initial_message}, format='json')
+    assert response.status_code == 201, response.data
+    room_id = ChatRoomUser.objects.filter(user_id=invitee.id).order_by('-invited_time').values_list('chat_room_id', flat=True).first()
+    response = invitee_client.post('/chat-invite/', {'room_id': str(room_id), 'accepted': True}, format='json')
+    assert response.status_code == 200, response.data
+    return room_id
+
+"""
+Replace the messages of given room with given number of messages sent two years ago by given user, and move them to
+an archive file in MESSAGE_ARCHIVE_DIR. Returns the archive.
+"""
+
+def archive_room_messages(room_id, sender_id, num_messages):
+    month = month_start(timezone.now(), -24)
+    create_message_partition(month)
+    Message.objects.filter(chat_room_id=room_id).delete()
+    Message.objects.bulk_create([
+        Message(chat_room_id=room_id, sender_id=sender_id, text='message %d' % seq, seq=seq, created_time=month + timedelta(minutes=seq))
+        for seq in range(1, num_messages + 1)
+    ])
+    # Check the deferred foreign keys of the new messages now, as their commit would have, since a partition with
+    # pending checks cannot be dropped.
+    with connection.cursor() as cursor:
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    return archive_message_partition(month)
@@ -0,0 +1,40 @@
+import tempfile
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from chat.models import ArchivedMessageSegment
+from chat.tests.helpers import archive_room_messages, create_room, create_user
+
+"""
+Archiving of a monthly partition of the message table.
+"""
+
+class ArchivePartitionTest(TestCase):
+
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        settings_override = override_settings(MESSAGE_ARCHIVE_DIR=self.archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.alice, self.alice_client = create_user('alice@example.com', 'alice')
+        self.bob, self.bob_client = create_user('bob@example.com', 'bob')
+        self.room_id = create_room(self.alice_client, self.bob, self.bob_client)
+
+    def test_message_table_is_locked_only_to_detach(self):
+        with CaptureQueriesContext(connection) as queries:
+            archive = archive_room_messages(self.room_id, self.alice.id, 3)
+        self.assertEqual(archive.num_messages, 3)
+        self.assertEqual(ArchivedMessageSegment.objects.get(archive=archive).num_messages, 3)
+
+        statements = [query['sql'] for query in queries.captured_queries]
+        detach = next(i for i, sql in enumerate(statements) if 'DETACH PARTITION' in sql)
+        # Only the lock timeout and the drop of the partition run while the message table is locked exclusively.
+        self.assertTrue(statements[detach - 1].startswith('SET LOCAL lock_timeout'))
+        after_detach = [sql for sql in statements[detach + 1:] if 'SAVEPOINT' not in sql]
+        self.assertEqual(len(after_detach), 1)
+        self.assertTrue(after_detach[0].startswith('DROP TABLE'))
+        self.assertTrue(any('INSERT INTO "chat_archivedmessagesegment"' in sql for sql in statements[:detach]))
+        self.assertTrue(any(sql.startswith('SELECT count(*)') for sql in statements[:detach]))
@@ -0,0 +1,46 @@
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.db import transaction
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from chat.authentication import issue_signed_token, revocation_list, revoke_signed_tokens
+from chat.models import TokenRevocation, User
+from chat.tests.helpers import create_user
+
+"""
+Revocation of signed auth tokens.
+"""
+
+class SignedTokenRevocationTest(TestCase):
+
+    def setUp(self):
+        self.user, _ = create_user('alice@example.com', 'alice')
+        self.signed_token = issue_signed_token(self.user)
+
+    def get_chats(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Signed ' + self.signed_token)
+        return client.get('/chats/')
+
+    def test_login_upgrading_password_hash_keeps_tokens(self):
+        # A hash made with fewer iterations than the current default, as left by an older Django version.
+        self.user.password = PBKDF2PasswordHasher().encode('correct-horse-battery', 'saltsaltsalt', iterations=1000)
+        self.user.save(update_fields=['password'])
+
+        response = APIClient().post('/login/', {'email': 'alice@example.com', 'password': 'correct-horse-battery'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertNotEqual(user.password, self.user.password)
+        self.assertEqual(user.token_version, self.user.token_version)
+        self.assertFalse(TokenRevocation.objects.filter(user_id=self.user.pk).exists())
+        self.assertEqual(self.get_chats().status_code, 200)
+
+    def test_revoked_tokens_are_rejected(self):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            revoke_signed_tokens(User.objects.get(pk=self.user.pk))
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.token_version, self.user.token_version + 1)
+        self.assertTrue(revocation_list.is_revoked(self.user.pk, self.user.token_version))
+        self.assertEqual(self.get_chats().status_code, 401)
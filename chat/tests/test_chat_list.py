@@ -0,0 +1,35 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from chat.models import User
+from chat.tests.helpers import create_room, create_user
+
+"""
+The chat list is assembled with a fixed number of queries, whatever the number of rooms on the page.
+"""
+
+class ChatListQueryCountTest(TestCase):
+
+    def setUp(self):
+        self.user, self.api_client = create_user('me@example.com', 'me')
+
+    def add_rooms(self, num_rooms):
+        start = User.objects.count()
+        for i in range(start, start + num_rooms):
+            other, other_client = create_user('other%d@example.com' % i, 'other%d' % i)
+            create_room(other_client, self.user, self.api_client)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.add_rooms(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.get('/chats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        num_queries = len(queries)
+
+        self.add_rooms(27)
+        with self.assertNumQueries(num_queries):
+            response = self.api_client.get('/chats/')
+        self.assertEqual(len(response.data), 30)
+        self.assertTrue(all(len(room['users']) == 2 for room in response.data))
@@ -0,0 +1,46 @@
+import gzip
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from chat.compression import CompressionMiddleware
+
+CONTENT = b'{"text": "hello"}' * 100
+
+"""
+Compression of responses by CompressionMiddleware.
+"""
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class CompressionMiddlewareTest(SimpleTestCase):
+
+    def get(self, content, middleware_class=CompressionMiddleware):
+        request = RequestFactory().get('/post/', HTTP_ACCEPT_ENCODING='gzip')
+        return middleware_class(lambda request: HttpResponse(content))(request)
+
+    def test_large_response_is_compressed(self):
+        response = self.get(CONTENT)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), CONTENT)
+
+    def test_small_response_is_left_alone(self):
+        response = self.get(CONTENT[:100])
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, CONTENT[:100])
+
+    def test_async_response_is_compressed(self):
+        async def get_response(request):
+            return HttpResponse(CONTENT)
+
+        middleware = CompressionMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get('/post/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(gzip.decompress(response.content), CONTENT)
+
+    @override_settings(DEBUG=True)
+    def test_middleware_stack_runs_natively_under_asgi(self):
+        # In debug, Django logs every sync middleware it has to adapt to an async request.
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from chat.models import Post
+from chat.tests.helpers import create_user
+
+"""
+Conditional GETs of the posts feed.
+"""
+
+class FeedValidatorTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.api_client = create_user('alice@example.com', 'alice')
+        for i in range(3):
+            response = self.api_client.post('/post/', {'title': 'post %d' % i, 'description': 'description'}, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+
+    def test_unchanged_feed_is_not_modified(self):
+        etag = self.api_client.get('/post/')['ETag']
+        response = self.api_client.get('/post/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_validators_do_not_aggregate_posts(self):
+        etag = self.api_client.get('/post/')['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.get('/post/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+            self.assertNotIn('MAX(', query['sql'].upper())
+
+    def test_new_post_changes_the_etag(self):
+        etag = self.api_client.get('/post/')['ETag']
+        Post.objects.bulk_create([Post(creator_user=self.user, title='title', description='description')])
+        self.assertEqual(self.api_client.get('/post/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_posts_deleted_by_another_process_change_the_etag(self):
+        etag = self.api_client.get('/post/')['ETag']
+
+        # Deleted without the signals of this process, as by the purge of an account running elsewhere.
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM chat_post WHERE id = %s', [Post.objects.values_list('id', flat=True).first()])
+
+        response = self.api_client.get('/post/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from chat.common import ChatRoomUserState
+from chat.deletion import purge_deleted_accounts, purge_expired_rooms, request_account_deletion
+from chat.models import AccountDeletion, ArchivedMessageSegment, ChatRoom, ChatRoomUser, InboxEntry, Message, User
+from chat.pagination import encode_sync_token
+from chat.tests.helpers import archive_room_messages, create_room, create_user
+
+"""
+Purge of the rooms of deleted accounts.
+"""
+
+class PurgeRoomsTest(TestCase):
+
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        settings_override = override_settings(MESSAGE_ARCHIVE_DIR=self.archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.alice, self.alice_client = create_user('alice@example.com', 'alice')
+        self.bob, self.bob_client = create_user('bob@example.com', 'bob')
+        self.room_id = create_room(self.alice_client, self.bob, self.bob_client)
+
+    def purge_alice(self):
+        with transaction.atomic():
+            request_account_deletion(self.alice)
+        purge_deleted_accounts()
+        self.assertIsNotNone(AccountDeletion.objects.get(user_id=self.alice.id).completed_time)
+        self.assertFalse(User.objects.filter(pk=self.alice.id).exists())
+
+    def test_other_members_keep_a_tombstone(self):
+        sync_token = self.bob_client.get('/sync/').data['token']
+        etag = self.bob_client.get('/chats/')['ETag']
+
+        self.purge_alice()
+
+        self.assertFalse(Message.objects.filter(chat_room_id=self.room_id).exists())
+        self.assertEqual(ChatRoomUser.objects.get(chat_room_id=self.room_id).state, ChatRoomUserState.DELETED.name)
+        entry = InboxEntry.objects.get(chat_room_id=self.room_id)
+        self.assertEqual(entry.user_id, self.bob.id)
+        self.assertFalse(entry.visible)
+        self.assertEqual(entry.last_message_text, '')
+
+        response = self.bob_client.get('/sync/', {'token': sync_token})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([(room['room_id'], room['visible']) for room in response.data['rooms']], [(str(self.room_id), False)])
+
+        response = self.bob_client.get('/chats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_expired_rooms_are_deleted(self):
+        self.purge_alice()
+        self.assertEqual(purge_expired_rooms(), 0)
+
+        ChatRoom.objects.filter(pk=self.room_id).update(last_updated_time=timezone.now() - timedelta(seconds=settings.SYNC_TOKEN_MAX_AGE + 1))
+        self.assertEqual(purge_expired_rooms(), 1)
+        self.assertFalse(ChatRoom.objects.filter(pk=self.room_id).exists())
+        self.assertFalse(InboxEntry.objects.filter(chat_room_id=self.room_id).exists())
+
+    def test_expired_sync_token_is_invalid(self):
+        token = encode_sync_token(timezone.now())
+        with override_settings(SYNC_TOKEN_MAX_AGE=-1):
+            response = self.bob_client.get('/sync/', {'token': token})
+        self.assertEqual(response.status_code, 400)
+
+    def test_archived_messages_are_erased(self):
+        archive = archive_room_messages(self.room_id, self.alice.id, 3)
+        segment = ArchivedMessageSegment.objects.get(chat_room_id=self.room_id)
+
+        self.purge_alice()
+
+        self.assertFalse(ArchivedMessageSegment.objects.filter(chat_room_id=self.room_id).exists())
+        with open(os.path.join(self.archive_dir.name, archive.path), 'rb') as archive_file:
+            archive_file.seek(segment.offset)
+            self.assertEqual(archive_file.read(segment.length), bytes(segment.length))
+        self.assertEqual(AccountDeletion.objects.get(user_id=self.alice.id).num_messages_deleted, 3)
@@ -0,0 +1,87 @@
+import threading
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from chat.checks import check_shared_cache
+from chat.feed import get_feed_page, get_feed_version, page_key
+from chat.models import Post
+from chat.tests.helpers import create_user
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'chat-feed-tests'}}
+
+"""
+Cached pages of the posts feed in the local memory cache backend.
+"""
+
+@override_settings(CACHES=LOCMEM_CACHES, FEED_CACHED_PAGES=2)
+class FeedCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.api_client = create_user('alice@example.com', 'alice')
+        self.num_builds = 0
+
+    def build(self, page=([], None, None)):
+        self.num_builds += 1
+        return page
+
+    def test_page_is_built_once(self):
+        self.assertEqual(get_feed_page(None, self.build), ([], None, None))
+        self.assertEqual(get_feed_page(None, self.build), ([], None, None))
+        self.assertEqual(self.num_builds, 1)
+
+    def test_only_first_pages_are_cached(self):
+        get_feed_page(None, lambda: self.build(([], 'cursor1', None)))
+        get_feed_page('cursor1', lambda: self.build(([], 'cursor2', None)))
+        self.assertEqual(self.num_builds, 2)
+        self.assertIsNone(get_feed_page('cursor2', self.build))
+        self.assertIsNone(get_feed_page('unknown', self.build))
+        self.assertEqual(self.num_builds, 2)
+
+    def test_post_changes_invalidate_pages(self):
+        get_feed_page(None, self.build)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(creator_user=self.user, title='title', description='description')
+        get_feed_page(None, self.build)
+        self.assertEqual(self.num_builds, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        get_feed_page(None, self.build)
+        self.assertEqual(self.num_builds, 3)
+
+    def test_concurrent_miss_waits_for_rebuild(self):
+        # Another request holds the rebuild lock of the page and stores it shortly.
+        key = page_key(get_feed_version(), None)
+        cache.add(key + '.lock', True)
+        timer = threading.Timer(0.1, lambda: cache.set(key, (['rebuilt'], None, None)))
+        timer.start()
+        try:
+            self.assertEqual(get_feed_page(None, self.build), (['rebuilt'], None, None))
+        finally:
+            timer.join()
+        self.assertEqual(self.num_builds, 0)
+
+    def test_feed_is_served_from_cache(self):
+        response = self.api_client.post('/post/', {'title': 'title', 'description': 'description'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(self.api_client.get('/post/').data), 1)
+
+        # Left out of the cached page until the next invalidation.
+        Post.objects.bulk_create([Post(creator_user=self.user, title='title', description='description')])
+        self.assertEqual(len(self.api_client.get('/post/').data), 1)
+
+"""
+Deployment check of the default cache.
+"""
+
+class SharedCacheCheckTest(SimpleTestCase):
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_local_memory_cache_fails(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['chat.E001'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
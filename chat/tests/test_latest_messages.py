@@ -0,0 +1,47 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from chat.models import Message
+from chat.tests.helpers import archive_room_messages, create_room, create_user
+
+"""
+Latest messages of rooms whose messages were moved to the archive.
+"""
+
+class LatestArchivedMessagesTest(TestCase):
+
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        settings_override = override_settings(MESSAGE_ARCHIVE_DIR=self.archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.alice, self.alice_client = create_user('alice@example.com', 'alice')
+        self.bob, self.bob_client = create_user('bob@example.com', 'bob')
+        self.room_id = create_room(self.alice_client, self.bob, self.bob_client)
+
+    def archive_room(self, num_messages):
+        archive_room_messages(self.room_id, self.alice.id, num_messages)
+        self.assertFalse(Message.objects.filter(chat_room_id=self.room_id).exists())
+
+    def get_latest(self, limit):
+        response = self.bob_client.get('/message/latest/', {'room_ids': str(self.room_id), 'limit': limit})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data[0]
+
+    def test_archived_messages_are_returned(self):
+        self.archive_room(3)
+        room = self.get_latest(5)
+        self.assertEqual([message['text'] for message in room['messages']], ['message 3', 'message 2', 'message 1'])
+        self.assertIsNone(room['next_cursor'])
+
+    def test_next_cursor_continues_into_archive(self):
+        self.archive_room(5)
+        room = self.get_latest(2)
+        self.assertEqual([message['text'] for message in room['messages']], ['message 5', 'message 4'])
+
+        response = self.bob_client.get('/message/', {'room_id': str(self.room_id), 'cursor': room['next_cursor']})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([message['text'] for message in response.data], ['message 3', 'message 2', 'message 1'])
@@ -0,0 +1,117 @@
+import io
+import threading
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from chat.models import OutboxEmail
+from chat.outbox import BASE_RETRY_DELAY, LEASE, MAX_ATTEMPTS, claim_batch, send_outbox
+
+"""
+Mail backend failing the first given number of messages, as a mail server dropping the connection would.
+"""
+
+class FailingEmailBackend(EmailBackend):
+
+    def __init__(self, num_failures=1, **kwargs):
+        super().__init__(**kwargs)
+        self.num_failures = num_failures
+
+    def send_messages(self, messages):
+        if self.num_failures > 0:
+            self.num_failures -= 1
+            raise ConnectionResetError("Connection reset by peer")
+        return super().send_messages(messages)
+
+"""
+Queue an email due now to given address. Returns the Outbox Email.
+"""
+
+def create_email(to_email='alice@example.com', **kwargs):
+    return OutboxEmail.objects.create(subject='subject', body='body', from_email='noreply@example.com', to_email=to_email, **kwargs)
+
+"""
+Claiming and sending emails of the outbox.
+"""
+
+class OutboxTest(TestCase):
+
+    def test_claimed_emails_are_leased(self):
+        email = create_email()
+        self.assertEqual([claimed.id for claimed in claim_batch(10)], [email.id])
+        self.assertGreater(OutboxEmail.objects.get(pk=email.id).next_attempt_time, timezone.now() + LEASE - timedelta(minutes=1))
+        self.assertEqual(claim_batch(10), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        email = create_email()
+        claim_batch(10)
+        # The worker holding the lease died without sending the email.
+        OutboxEmail.objects.filter(pk=email.id).update(next_attempt_time=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([claimed.id for claimed in claim_batch(10)], [email.id])
+
+    def test_failed_email_is_retried_with_backoff(self):
+        email = create_email()
+        connection = get_connection('chat.tests.test_outbox.FailingEmailBackend')
+        with self.assertLogs('chat.outbox', 'WARNING'):
+            self.assertEqual(send_outbox(connection), 0)
+
+        email = OutboxEmail.objects.get(pk=email.id)
+        self.assertIsNone(email.sent_time)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('Connection reset', email.last_error)
+        self.assertGreater(email.next_attempt_time, timezone.now() + BASE_RETRY_DELAY * 0.5 - timedelta(seconds=5))
+        self.assertEqual(claim_batch(10), [])
+
+        OutboxEmail.objects.filter(pk=email.id).update(next_attempt_time=timezone.now())
+        self.assertEqual(send_outbox(connection), 1)
+        self.assertIsNotNone(OutboxEmail.objects.get(pk=email.id).sent_time)
+        self.assertEqual([message.to for message in mail.outbox], [['alice@example.com']])
+
+    def test_email_failing_too_often_is_given_up(self):
+        create_email(attempts=MAX_ATTEMPTS)
+        self.assertEqual(claim_batch(10), [])
+
+    def test_command_sends_due_emails(self):
+        create_email()
+        create_email('bob@example.com', next_attempt_time=timezone.now() + timedelta(hours=1))
+        call_command('send_outbox_emails', '--once', stdout=io.StringIO())
+        self.assertEqual([message.to for message in mail.outbox], [['alice@example.com']])
+
+"""
+Workers claiming the outbox concurrently.
+"""
+
+class ConcurrentClaimTest(TransactionTestCase):
+
+    def test_locked_emails_are_skipped(self):
+        locked = create_email()
+        other = create_email('bob@example.com')
+        claimed = []
+        locked_event = threading.Event()
+        release_event = threading.Event()
+
+        # Another worker is in the middle of claiming the first email.
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(OutboxEmail.objects.filter(pk=locked.id).select_for_update())
+                    locked_event.set()
+                    release_event.wait(10)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(locked_event.wait(10))
+            claimed = claim_batch(10)
+        finally:
+            release_event.set()
+            thread.join()
+        self.assertEqual([email.id for email in claimed], [other.id])
@@ -0,0 +1,153 @@
+import json
+import random
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from chat.common import ChatRoomUserState
+from chat.models import ChatRoom, ChatRoomUser, InboxEntry, Message, Post, User
+
+# Plan nodes which mean that a hot query reads a whole table or sorts rows instead of walking an index.
+FORBIDDEN_NODES = ('Seq Scan', 'Sort', 'Incremental Sort')
+
+# Queries are explained with these nodes disabled, so that they only show up in a plan when no index can serve the
+# query, whatever the planner would pick on tables as small as the seeded ones.
+PLANNER_SETTINGS = 'SET enable_seqscan = off; SET enable_sort = off; SET enable_incremental_sort = off'
+RESET_PLANNER_SETTINGS = 'RESET enable_seqscan; RESET enable_sort; RESET enable_incremental_sort'
+
+NUM_USERS = 2000
+NUM_ROOMS = 2000
+NUM_ROOMS_OF_USER = 60
+MESSAGES_PER_ROOM = 25
+NUM_POSTS = 20000
+
+"""
+Returns the node types of given EXPLAIN (FORMAT JSON) plan and of all its children.
+"""
+
+def plan_nodes(plan):
+    yield plan['Node Type']
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+"""
+Query plans of the endpoints polled by clients. Seeds a realistic volume of users, rooms, messages and posts, calls
+every endpoint and runs EXPLAIN on each query it made. Fails if one of them scans a whole table or sorts, which
+means that an index it relies on is missing or no longer matches its order.
+"""
+
+class QueryPlanTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        now = timezone.now()
+        users = User.objects.bulk_create([User(email='user%d@example.com' % i, username='user%d' % i, password='!') for i in range(NUM_USERS)], batch_size=1000)
+        cls.user = users[0]
+        cls.other = users[1]
+        tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users], batch_size=1000)
+        cls.token = tokens[0]
+
+        rooms = ChatRoom.objects.bulk_create([
+            ChatRoom(creator_user_id=users[0].id, name='room%d' % i, last_updated_time=now - timedelta(minutes=i), last_message_seq=MESSAGES_PER_ROOM)
+            for i in range(NUM_ROOMS)
+        ], batch_size=1000)
+        cls.room = rooms[0]
+
+        # The user is in the first rooms, the others are between two random users.
+        members = []
+        for i, room in enumerate(rooms):
+            first = users[0] if i < NUM_ROOMS_OF_USER else rng.choice(users[2:])
+            second = users[1] if i == 0 else rng.choice(users[2:])
+            members += [(room, first), (room, second)]
+        ChatRoomUser.objects.bulk_create([ChatRoomUser(chat_room=room, user_id=user.id, state=ChatRoomUserState.JOINED.name, joined_time=now) for room, user in members], batch_size=1000)
+        InboxEntry.objects.bulk_create([InboxEntry(chat_room=room, user_id=user.id, visible=True, sort_time=room.last_updated_time) for room, user in members], batch_size=1000)
+
+        Message.objects.bulk_create([
+            Message(chat_room=room, sender_id=users[0].id, text='message %d' % seq, seq=seq, created_time=now - timedelta(minutes=i, seconds=MESSAGES_PER_ROOM - seq))
+            for i, room in enumerate(rooms) for seq in range(1, MESSAGES_PER_ROOM + 1)
+        ], batch_size=5000)
+        Post.objects.bulk_create([
+            Post(creator_user=rng.choice(users), title='post %d' % i, description='description', created_time=now - timedelta(seconds=i))
+            for i in range(NUM_POSTS)
+        ], batch_size=5000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        # Pages cached by other tests refer to rolled back data.
+        cache.clear()
+        self.api_client = APIClient()
+        self.api_client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    """
+    Call given endpoint and check the plan of every query it made. Queries of given sorted_table may sort rows which
+    they read through an index.
+    """
+
+    def assertIndexedPlans(self, path, params=None, sorted_table=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.get(path, params or {})
+        self.assertEqual(response.status_code, 200, response.data)
+
+        num_explained = 0
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(PLANNER_SETTINGS)
+                try:
+                    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                    plan = cursor.fetchone()[0]
+                finally:
+                    cursor.execute(RESET_PLANNER_SETTINGS)
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = set(plan_nodes(plan[0]['Plan']))
+            forbidden_nodes = set(FORBIDDEN_NODES)
+            if sorted_table is not None and ' FROM "%s"' % sorted_table in sql:
+                forbidden_nodes -= {'Sort', 'Incremental Sort'}
+            self.assertFalse(nodes & forbidden_nodes, "%s of %s uses %s:\n%s" % (path, params, nodes & forbidden_nodes, sql))
+            num_explained += 1
+        self.assertGreater(num_explained, 0)
+        return response
+
+    def test_chat_list(self):
+        response = self.assertIndexedPlans('/chats/')
+        self.assertIndexedPlans('/chats/', {'cursor': response['X-Next-Cursor']})
+
+    def test_sync(self):
+        # New messages of all rooms of the user are merged by time, which no single index can walk.
+        response = self.assertIndexedPlans('/sync/', sorted_table='chat_message')
+        self.assertIndexedPlans('/sync/', {'token': response.data['token']}, sorted_table='chat_message')
+
+    def test_messages(self):
+        response = self.assertIndexedPlans('/message/', {'room_id': str(self.room.id)})
+        self.assertIndexedPlans('/message/', {'room_id': str(self.room.id), 'cursor': response['X-Next-Cursor']})
+
+    def test_latest_messages(self):
+        room_ids = ChatRoomUser.objects.filter(user_id=self.user.id).values_list('chat_room_id', flat=True)[:20]
+        self.assertIndexedPlans('/message/latest/', {'room_ids': ','.join(str(room_id) for room_id in room_ids)})
+
+    def test_unread_messages(self):
+        created_time = (timezone.now() - timedelta(seconds=10)).isoformat()
+        self.assertIndexedPlans('/unread-message/', {'room_id': str(self.room.id), 'created_time': created_time})
+
+    def test_chat_room(self):
+        self.assertIndexedPlans('/chat-room/', {'room_id': str(self.room.id)})
+        self.assertIndexedPlans('/chat-room-exists/', {'other_id': str(self.other.id)})
+
+    def test_posts(self):
+        response = self.assertIndexedPlans('/post/')
+        self.assertIndexedPlans('/post/', {'cursor': response['X-Next-Cursor']})
+
+    def test_username_search(self):
+        self.assertIndexedPlans('/users/search/', {'prefix': 'user12'})
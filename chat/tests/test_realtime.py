@@ -0,0 +1,56 @@
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework.authtoken.models import Token
+
+from chat.broker import get_broker
+from chat.realtime import websocket_application
+from chat.tests.helpers import create_user
+
+"""
+Connecting to the websocket of real time events. Transactional since websockets authenticate outside of the request
+cycle, closing the connection of their thread like a request does.
+"""
+
+class WebsocketTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user, _ = create_user('alice@example.com', 'alice')
+        self.token = Token.objects.get(user=self.user).key
+
+    async def connect(self, query_string=b'', headers=()):
+        scope = {'type': 'websocket', 'path': settings.CHAT_WEBSOCKET_PATH, 'query_string': query_string, 'headers': list(headers)}
+        communicator = ApplicationCommunicator(websocket_application, scope)
+        await communicator.send_input({'type': 'websocket.connect'})
+        return communicator, await communicator.receive_output(timeout=5)
+
+    async def test_authenticated_user_receives_events(self):
+        communicator, response = await self.connect(query_string=('token=%s' % self.token).encode())
+        self.assertEqual(response, {'type': 'websocket.accept'})
+        # The connection used to authenticate is not kept open by the websocket.
+        self.assertIsNone(await sync_to_async(lambda: connection.connection)())
+
+        get_broker().publish([self.user.id], {"type": "read", "room_id": "room"})
+        response = await communicator.receive_output(timeout=5)
+        self.assertEqual(response, {'type': 'websocket.send', 'text': '{"type": "read", "room_id": "room"}'})
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(timeout=5)
+
+    async def test_authorization_header_is_accepted(self):
+        communicator, response = await self.connect(headers=[(b'authorization', ('Token %s' % self.token).encode())])
+        self.assertEqual(response, {'type': 'websocket.accept'})
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(timeout=5)
+
+    async def test_invalid_token_is_rejected(self):
+        communicator, response = await self.connect(query_string=b'token=invalid')
+        self.assertEqual(response, {'type': 'websocket.close', 'code': 4001})
+        await communicator.wait(timeout=5)
+
+    async def test_missing_token_is_rejected(self):
+        communicator, response = await self.connect()
+        self.assertEqual(response, {'type': 'websocket.close', 'code': 4001})
+        await communicator.wait(timeout=5)
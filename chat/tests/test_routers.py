@@ -0,0 +1,93 @@
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from chat.models import Post
+from chat.routers import ReplicaPinningMiddleware, ReplicaRouter, query_counts, read_replica
+from chat.tests.helpers import create_user
+
+# Replica alias set up by DATABASE_REPLICA_HOSTS, as a test mirror of the default database.
+REPLICA = 'replica0'
+
+"""
+Routing of reads to replicas and pinning of users who wrote to the primary.
+"""
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user, _ = create_user('alice@example.com', 'alice')
+        self.router = ReplicaRouter()
+
+    def test_reads_within_read_replica_go_to_replica(self):
+        with read_replica(self.user) as using:
+            self.assertEqual(using, REPLICA)
+            self.assertEqual(self.router.db_for_read(Post), REPLICA)
+            self.assertEqual(self.router.db_for_write(Post), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_write_requests_pin_user_to_primary(self):
+        request = RequestFactory().get('/chats/')
+        request.user = self.user
+        ReplicaPinningMiddleware(lambda request: HttpResponse())(request)
+        with read_replica(self.user) as using:
+            self.assertEqual(using, REPLICA)
+
+        request = RequestFactory().post('/message/')
+        request.user = self.user
+        ReplicaPinningMiddleware(lambda request: HttpResponse())(request)
+        with read_replica(self.user) as using:
+            self.assertEqual(using, DEFAULT_DB_ALIAS)
+
+    def test_middleware_supports_async_requests(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        request = RequestFactory().post('/message/')
+        request.user = self.user
+        async_to_sync(middleware)(request)
+        with read_replica(self.user) as using:
+            self.assertEqual(using, DEFAULT_DB_ALIAS)
+
+"""
+Queries of read only views served by a second database. Runs when the tests are started with a replica, as in
+DATABASE_REPLICA_HOSTS=127.0.0.1, which then reads the test database over a connection of its own.
+"""
+
+@skipUnless(REPLICA in settings.DATABASES, "No replica configured")
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaQueryTest(TransactionTestCase):
+
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.api_client = create_user('alice@example.com', 'alice')
+
+    def test_replica_runs_repeatable_read(self):
+        with transaction.atomic(using=REPLICA), connections[REPLICA].cursor() as cursor:
+            cursor.execute('SHOW transaction_isolation')
+            self.assertEqual(cursor.fetchone()[0], 'repeatable read')
+
+    def test_reads_go_to_replica_until_user_writes(self):
+        before = query_counts.snapshot().get(REPLICA, 0)
+        response = self.api_client.get('/chats/')
+        self.assertEqual(response.status_code, 200, response.data)
+        after = query_counts.snapshot().get(REPLICA, 0)
+        self.assertGreater(after, before)
+
+        response = self.api_client.post('/post/', {'title': 'title', 'description': 'description'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        response = self.api_client.get('/chats/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(query_counts.snapshot().get(REPLICA, 0), after)
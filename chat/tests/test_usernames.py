@@ -0,0 +1,91 @@
+import threading
+
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from chat.models import User
+from chat.tests.helpers import create_user
+from chat.usernames import BloomFilter, UsernameFilter
+
+"""
+Bloom filter of the usernames taken.
+"""
+
+class BloomFilterTest(SimpleTestCase):
+
+    def test_added_strings_are_found(self):
+        bloom = BloomFilter(100, 0.01)
+        bloom.add('alice')
+        self.assertIn('alice', bloom)
+        self.assertNotIn('bob', bloom)
+
+    def test_strings_added_again_are_counted_once(self):
+        bloom = BloomFilter(100, 0.01)
+        for _ in range(20):
+            bloom.add('alice')
+        self.assertEqual(bloom.count, 1)
+
+"""
+Loading and refreshing the username filter of a process.
+"""
+
+class UsernameFilterTest(TestCase):
+
+    def setUp(self):
+        create_user('alice@example.com', 'alice')
+        self.filter = UsernameFilter()
+
+    def test_refreshes_do_not_fill_the_filter(self):
+        self.filter.rebuild()
+        for _ in range(20):
+            # Every refresh re-reads the users updated within the overlap, alice included.
+            self.filter.refreshed_monotonic = None
+            self.filter.refresh_if_stale()
+        self.assertTrue(self.filter.may_be_taken('alice'))
+        self.assertFalse(self.filter.may_be_taken('bob'))
+        self.assertEqual(self.filter.bloom.count, 1)
+
+    def test_first_load_runs_in_background(self):
+        # Usernames may be taken until the filter is loaded, so they are checked in the database meanwhile.
+        self.assertTrue(self.filter.may_be_taken('bob'))
+        thread = self.filter.rebuild_thread
+        self.assertIsNotNone(thread)
+        thread.join()
+        self.assertIsNone(self.filter.rebuild_thread)
+        self.assertIsNotNone(self.filter.bloom)
+
+"""
+Claiming a username taken by another user.
+"""
+
+class UsernameClaimTest(TestCase):
+
+    def test_taken_username_is_rejected(self):
+        create_user('alice@example.com', 'alice')
+        bob, bob_client = create_user('bob@example.com', '')
+        response = bob_client.post('/username/', {'username': 'alice'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.get(pk=bob.pk).username, '')
+
+class ConcurrentUsernameClaimTest(TransactionTestCase):
+
+    def test_only_one_concurrent_claim_wins(self):
+        clients = [create_user('user%d@example.com' % i, '')[1] for i in range(4)]
+        barrier = threading.Barrier(len(clients))
+        statuses = []
+
+        def claim(client):
+            try:
+                barrier.wait()
+                statuses.append(client.post('/username/', {'username': 'alice'}, format='json').status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=claim, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201, 400, 400, 400])
+        self.assertEqual(User.objects.filter(username='alice').count(), 1)
@@ -0,0 +1,132 @@
+import functools
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE codes of errors after which the transaction can be safely retried.
+SERIALIZATION_FAILURE = '40001'
+DEADLOCK_DETECTED = '40P01'
+
+"""
+Transaction modes for read only views. Connections default to SERIALIZABLE (see settings.DATABASES) which
+write paths rely on, but pure reads do not need its predicate locks and should never abort concurrent writers.
+"""
+
+# Consistent snapshot of the database without predicate locks. Reads never block or abort writers.
+READ_ONLY = 'ISOLATION LEVEL REPEATABLE READ, READ ONLY'
+
+# Serializable snapshot which waits at start until it is free of anomalies and then runs without predicate locks.
+# Suited to long reads which must see a state consistent with every serializable writer.
+READ_ONLY_DEFERRABLE = 'ISOLATION LEVEL SERIALIZABLE, READ ONLY, DEFERRABLE'
+
+# Every statement sees the latest committed data. Cheapest, for reads which do not need a consistent snapshot
+# across statements.
+READ_COMMITTED = 'ISOLATION LEVEL READ COMMITTED, READ ONLY'
+
+# Writes where every statement sees the latest committed data. Concurrent updates of a row wait for each other
+# instead of failing with a serialization error, so it only suits writes made of single statements computing new
+# values from the current row, such as counters (see add_message_to_chat_room).
+WRITE_READ_COMMITTED = 'ISOLATION LEVEL READ COMMITTED'
+
+"""
+Atomic block running the transaction in given mode. The mode only applies when the block starts the transaction;
+nested in an existing transaction it behaves like transaction.atomic.
+"""
+
+@contextmanager
+def isolated_atomic(mode, using=None):
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=using):
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ' + mode)
+        yield
+
+"""
+Atomic block for read only views running the transaction in given mode.
+"""
+
+@contextmanager
+def read_only_atomic(mode=READ_ONLY, using=None):
+    with isolated_atomic(mode, using):
+        yield
+
+"""
+Counters of serialization conflicts and retries per endpoint and per room, for this process.
+"""
+
+class ConflictMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = Counter()
+        self.rooms = Counter()
+
+    def record(self, endpoint, event, room_id=None):
+        with self.lock:
+            self.endpoints[(endpoint, event)] += 1
+            if room_id is not None and event == 'conflict':
+                self.rooms[(endpoint, str(room_id))] += 1
+
+    """
+    Returns counters of every endpoint and the most contended rooms.
+    """
+
+    def snapshot(self, num_rooms=20):
+        with self.lock:
+            endpoints = {}
+            for (endpoint, event), count in self.endpoints.items():
+                endpoints.setdefault(endpoint, {})[event] = count
+            rooms = [{"endpoint": endpoint, "room_id": room_id, "conflicts": count} for (endpoint, room_id), count in self.rooms.most_common(num_rooms)]
+        return {"endpoints": endpoints, "rooms": rooms}
+
+conflict_metrics = ConflictMetrics()
+
+"""
+Returns True if given database error is a serialization failure or deadlock after which the transaction
+can be retried.
+"""
+
+def is_retryable_conflict(error):
+    cause = error.__cause__
+    return getattr(cause, 'pgcode', None) in (SERIALIZATION_FAILURE, DEADLOCK_DETECTED)
+
+"""
+Decorator for write view methods which re-runs the method when its transaction fails with a serialization
+failure, with jittered exponential backoff and at most max_attempts attempts. The method must do all of its
+writes in transactions it opens itself so that a failed attempt leaves nothing behind. Conflicts are counted
+under given endpoint name and the room_id of the request if any.
+"""
+
+def retry_on_conflict(endpoint, max_attempts=5, base_delay=0.01, max_delay=0.5):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            attempt = 1
+            while True:
+                try:
+                    return method(view, request, *args, **kwargs)
+                except OperationalError as e:
+                    if not is_retryable_conflict(e) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+                        raise
+                    room_id = request.data.get('room_id') if hasattr(request.data, 'get') else None
+                    conflict_metrics.record(endpoint, 'conflict', room_id)
+                    if attempt >= max_attempts:
+                        conflict_metrics.record(endpoint, 'exhausted')
+                        logger.warning("Giving up on %s for room %s after %d conflicting attempts", endpoint, room_id, attempt)
+                        raise
+                    logger.info("Retrying %s for room %s after serialization conflict (attempt %d)", endpoint, room_id, attempt)
+
+                time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+                conflict_metrics.record(endpoint, 'retry')
+                attempt += 1
+        return wrapper
+    return decorator
@@ -1,22 +1,29 @@
 from django.urls import path
 
-from . import service
+from . import realtime, service
 
 urlpatterns = [
     path('user/create/', service.CreateUser.as_view()),
     path('post/', service.PostManager.as_view()),
+    path('post/search/', service.PostSearchManager.as_view()),
     path('chats/', service.ChatRoomsPerUserManager.as_view()),
     path('message/', service.MessagesManager.as_view()),
+    path('message/latest/', service.LatestMessagesManager.as_view()),
     path('chat-room/', service.ChatRoomManager.as_view()),
     path('chat-room-exists/', service.AlreadyExistingChatRoom.as_view()),
     path('chat-invite/', service.ManageChatInviteRequest.as_view()),
     path('read/', service.MarkChatAsRead.as_view()),
-    path('unread-message/', service.UnreadMessagesManager.as_view()),
+    path('unread-message/', realtime.long_poll_view(service.UnreadMessagesManager.as_view())),
+    path('sync/', service.SyncManager.as_view()),
     # Fetch token for given user credentials.
     path('login/', service.Login.as_view()),
     path('signup/', service.SignUp.as_view()),
     path('activate/', service.ActivateAccount.as_view()),
     path('username/', service.UserNameManager.as_view()),
+    path('username/available/', service.UsernameAvailabilityManager.as_view()),
+    path('users/search/', service.UserSearchManager.as_view()),
     path('feedback/', service.FeedbackManager.as_view()),
-    path('delete-account/', service.AccountDeletionManager.as_view())
+    path('delete-account/', service.AccountDeletionManager.as_view()),
+    path('metrics/conflicts/', service.ConflictMetricsManager.as_view()),
+    path('metrics/databases/', service.DatabaseMetricsManager.as_view())
 ]
\ No newline at end of file
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from chat.models import User
+
+logger = logging.getLogger(__name__)
+
+"""
+Bloom filter of strings. Answers whether a string may have been added (with a false positive rate of about
+error_rate while holding at most capacity strings) or was definitely never added. Strings added again do not
+count towards capacity, as long as they set no new bit.
+"""
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, value):
+        added = False
+        for position in self.positions(value):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                self.bits[position >> 3] |= 1 << (position & 7)
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+"""
+Per process filter of the usernames taken by users, loaded on first use and refreshed every
+USERNAME_FILTER_REFRESH seconds from users updated since the previous refresh. A username missing from the
+filter is definitely available as of the last refresh; one present in it may be taken and must be checked in the
+database. Usernames released by deleted accounts stay in the filter until it is rebuilt, which only costs a query.
+The first load and rebuilds of a filter over capacity scan every user, so they run on a background thread while
+requests keep using the previous filter, or the database until the first load completes.
+"""
+
+class UsernameFilter:
+
+    # Users are re-read from this many seconds before the last refresh to tolerate clock skew and
+    # transactions committing late.
+    REFRESH_OVERLAP = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.refreshed_time = None
+        self.refreshed_monotonic = None
+        self.rebuild_thread = None
+
+    def add(self, username):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(username)
+
+    def may_be_taken(self, username):
+        self.refresh_if_stale()
+        with self.lock:
+            # Still being loaded by another thread.
+            return self.bloom is None or username in self.bloom
+
+    def refresh_if_stale(self):
+        with self.lock:
+            if self.rebuild_thread is not None:
+                return
+            if self.refreshed_monotonic is not None and time.monotonic() - self.refreshed_monotonic < getattr(settings, 'USERNAME_FILTER_REFRESH', 5):
+                return
+            if self.bloom is None or self.bloom.count > self.bloom.capacity:
+                # First load, or the filter is over capacity and has to be rebuilt larger.
+                self.rebuild_thread = threading.Thread(target=self.rebuild_in_background, name='username-filter-rebuild', daemon=True)
+                self.rebuild_thread.start()
+                return
+            since = self.refreshed_time - timedelta(seconds=self.REFRESH_OVERLAP)
+            self.refreshed_time = timezone.now()
+            self.refreshed_monotonic = time.monotonic()
+
+        for username in User.objects.filter(last_updated_time__gt=since).exclude(username='').values_list('username', flat=True):
+            self.add(username)
+
+    def rebuild(self):
+        started_time = timezone.now()
+        usernames = User.objects.exclude(username='')
+        capacity = max(getattr(settings, 'USERNAME_FILTER_CAPACITY', 100000), 2 * usernames.count())
+        bloom = BloomFilter(capacity, getattr(settings, 'USERNAME_FILTER_ERROR_RATE', 0.01))
+        for username in usernames.values_list('username', flat=True).iterator(chunk_size=10000):
+            bloom.add(username)
+        with self.lock:
+            self.bloom = bloom
+            # Usernames claimed during the scan are picked up by the next refresh.
+            self.refreshed_time = started_time
+            self.refreshed_monotonic = time.monotonic()
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Failed to load the username filter")
+            with self.lock:
+                # Retried by the first request after the refresh interval.
+                self.refreshed_monotonic = time.monotonic()
+        finally:
+            with self.lock:
+                self.rebuild_thread = None
+            # The thread runs outside of any request, so its connection is closed here.
+            connection.close()
+
+username_filter = UsernameFilter()
+
+"""
+Returns True if given username is not taken by any user. Most available usernames are answered by the username
+filter without a query.
+"""
+
+def is_username_available(username):
+    if not username_filter.may_be_taken(username):
+        return True
+    return not User.objects.filter(username__exact=username).exists()
+
+"""
+Add given username to the username filter of this process once the current transaction commits.
+"""
+
+def record_username(username):
+    transaction.on_commit(lambda: username_filter.add(username))
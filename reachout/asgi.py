@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reachout.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up since it depends on the models.
+from django.conf import settings
+from chat.realtime import websocket_application
+
+"""
+Routes websocket connections on CHAT_WEBSOCKET_PATH to the real time chat application and everything else to Django.
+"""
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket' and scope['path'] == settings.CHAT_WEBSOCKET_PATH:
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import importlib.util
 from pathlib import Path
 import psycopg2
 import environ
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_extensions',
     'rest_framework.authtoken',
@@ -51,12 +53,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'chat.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'chat.routers.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'reachout.urls'
@@ -65,12 +69,38 @@ AUTH_USER_MODEL = 'chat.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'chat.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.TokenAuthentication',
-    ]
+    ],
+    # Encodes with orjson when installed, byte compatible with the default JSON renderer.
+    'DEFAULT_RENDERER_CLASSES': [
+        'chat.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# MessagePack responses for clients sending Accept: application/msgpack, when the msgpack package is installed.
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'chat.renderers.MessagePackRenderer')
+
+# Signed auth tokens (chat.authentication) expire after this many seconds.
+SIGNED_TOKEN_MAX_AGE = 30 * 24 * 60 * 60
+
+# Sync tokens expire after this many seconds, after which clients sync from scratch. Rooms of deleted accounts are
+# kept as hidden entries in the chat list of their other members for as long (see chat.deletion), so that every
+# valid sync token reports their removal.
+SYNC_TOKEN_MAX_AGE = 30 * 24 * 60 * 60
+# Seconds after which a token revocation made by another process is seen by this one.
+SIGNED_TOKEN_REVOCATION_REFRESH = 5
+
 AUTHENTICATION_BACKENDS = ['chat.email_auth_backend.EmailBackend']
 
+# Real time delivery of chat events over websockets (served by reachout.asgi).
+# Use 'chat.broker.PostgresBroker' to deliver events across several nodes with Postgres LISTEN/NOTIFY.
+CHAT_BROKER = 'chat.broker.InProcessBroker'
+CHAT_BROKER_CHANNEL = 'reachout_events'
+CHAT_WEBSOCKET_PATH = '/ws/'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -111,6 +141,55 @@ DATABASES = {
     }
 }
 
+# Read replicas of the default database, as a comma separated list of hosts (e.g. DATABASE_REPLICA_HOSTS=10.0.0.2,10.0.0.3).
+# Read only views are routed to a replica by chat.routers.ReplicaRouter; everything else stays on default.
+DATABASE_REPLICAS = []
+for i, host in enumerate(env.list('DATABASE_REPLICA_HOSTS', default=[])):
+    DATABASES['replica' + str(i)] = {
+        **DATABASES['default'],
+        'HOST': host,
+        # Hot standbys refuse serializable transactions. Reads routed to replicas run in REPEATABLE READ snapshots.
+        'OPTIONS': {**DATABASES['default']['OPTIONS'], 'isolation_level': psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica' + str(i))
+
+DATABASE_ROUTERS = ['chat.routers.ReplicaRouter']
+
+# Shared by all nodes in production (e.g. CACHE_URL=redis://127.0.0.1:6379/1), local memory by default for a single
+# development process. manage.py check --deploy fails on a local memory cache (see chat.checks).
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+# Number of first pages of the posts feed kept in the cache, and for how many seconds.
+FEED_CACHED_PAGES = 3
+FEED_CACHE_TIMEOUT = 60
+
+# Per process filter answering most username availability checks without a query (chat.usernames): expected number
+# of usernames, false positive rate, and seconds after which usernames claimed through other processes are seen.
+USERNAME_FILTER_CAPACITY = 100000
+USERNAME_FILTER_ERROR_RATE = 0.01
+USERNAME_FILTER_REFRESH = 5
+
+# Username search results cached per process for hot prefixes, and for how many seconds. 0 disables the cache.
+USERNAME_SEARCH_CACHE_SIZE = 1000
+USERNAME_SEARCH_CACHE_TIMEOUT = 30
+
+# Responses of at least this many bytes are compressed with brotli (when installed) or gzip, as accepted by the client.
+COMPRESSION_MIN_SIZE = 1024
+
+# Seconds during which reads of a user who just wrote go to the primary so that they see their own writes.
+# Pins are kept in the default cache, which must be shared between nodes when running more than one.
+REPLICA_PIN_SECONDS = 5
+
+# Messages are stored in monthly partitions. The archive_messages command creates the partitions of the next
+# MESSAGE_PARTITION_MONTHS_AHEAD months and moves partitions older than MESSAGE_HOT_MONTHS months to compressed
+# files in MESSAGE_ARCHIVE_DIR, from which old pages of messages are read. The directory must be shared by every node.
+MESSAGE_ARCHIVE_DIR = env('MESSAGE_ARCHIVE_DIR', default=str(BASE_DIR / 'message_archive'))
+MESSAGE_HOT_MONTHS = env.int('MESSAGE_HOT_MONTHS', default=12)
+MESSAGE_PARTITION_MONTHS_AHEAD = 3
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -156,10 +235,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Email Verification settings. Will be used for user activation as well as password reset flows.
 # Bottom of settings.py
+# Emails are queued in the outbox and delivered by the send_outbox_emails command. The host can be pointed at a
+# local SMTP server for testing.
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.sendgrid.net'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_HOST = env('EMAIL_HOST', default='smtp.sendgrid.net')
+EMAIL_PORT = env.int('EMAIL_PORT', default=587)
+EMAIL_USE_TLS = env.bool('EMAIL_USE_TLS', default=True)
 EMAIL_HOST_USER = 'apikey'
 EMAIL_HOST_PASSWORD = env('SENDGRID_API_KEY')
 